@@ -1,9 +1,11 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import Any, Awaitable, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+import asyncio
 import json
 
-from app.db.database import get_db
+from app.db.database import get_db, SessionLocal
 from app.models.models import User, Conversation, Message
 from app.schemas.schemas import (
     ChatRequest, ChatResponse, 
@@ -11,62 +13,143 @@ from app.schemas.schemas import (
     ConversationWithMessages,
     Message as MessageSchema
 )
+from app.core.config import settings
+from app.services.conversation_memory import ConversationHistory, conversation_memory
 from app.services.rag_service import RAGService
 from app.services.gemini_service import GeminiService
-from app.utils.dependencies import get_current_active_user
+from app.utils.dependencies import get_current_active_user, get_rag_service
 
 router = APIRouter()
 
 
-@router.post("/", response_model=ChatResponse)
-async def chat_with_rag(
-    chat_request: ChatRequest,
-    mode: Optional[str] = Query("rag", regex="^(rag|general)$"),  # mode controls RAG or General Chat
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
-):
-    """
-    Send a message and get AI response; mode controls RAG vs General chat
-    """
-    rag_service = RAGService()
-    gemini_service = GeminiService()
-
-    # Get or create conversation
+def _get_or_create_conversation(db: Session, chat_request: ChatRequest, user: User) -> Conversation:
     if chat_request.conversation_id:
         conversation = db.query(Conversation).filter(
             Conversation.id == chat_request.conversation_id,
-            Conversation.user_id == current_user.id
+            Conversation.user_id == user.id
         ).first()
         if not conversation:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Conversation not found"
             )
-    else:
-        conversation_title = chat_request.message[:50]
-        if len(chat_request.message) > 50:
-            conversation_title += "..."
-        conversation = Conversation(
-            user_id=current_user.id,
-            title=conversation_title
-        )
-        db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
+        return conversation
+
+    conversation_title = chat_request.message[:50]
+    if len(chat_request.message) > 50:
+        conversation_title += "..."
+    conversation = Conversation(
+        user_id=user.id,
+        title=conversation_title
+    )
+    db.add(conversation)
+    db.commit()
+    db.refresh(conversation)
+    return conversation
+
+
+def _load_history(db: Session, conversation: Conversation, mode: str) -> Optional[ConversationHistory]:
+    """Prior turns for a RAG question; load before the question itself is saved"""
+    if mode != "rag" or not settings.conversation_history_enabled:
+        return None
+    return conversation_memory.load(db, conversation)
+
 
-    # Save user message
+def _save_user_message(db: Session, conversation: Conversation, content: str):
     user_message = Message(
         conversation_id=conversation.id,
         role="user",
-        content=chat_request.message
+        content=content
     )
     db.add(user_message)
     db.commit()
+    conversation_memory.append(conversation.id, user_message.id, "user", content)
+
+
+def _remember_assistant_message(message: Message):
+    conversation_memory.append(message.conversation_id, message.id, "assistant", message.content)
+    conversation_memory.schedule_summary(message.conversation_id)
+
+
+def _save_assistant_message(conversation_id: int, content: str, sources: Optional[List[Dict[str, Any]]],
+                            chunks_retrieved: int) -> int:
+    """Save a streamed answer in its own session (the request session may be closed by now)"""
+    sources_json, relevance_score = _summarize_sources(sources, chunks_retrieved)
+    with SessionLocal() as stream_db:
+        assistant_message = Message(
+            conversation_id=conversation_id,
+            role="assistant",
+            content=content,
+            sources=sources_json,
+            relevance_score=relevance_score
+        )
+        stream_db.add(assistant_message)
+        stream_db.commit()
+        stream_db.refresh(assistant_message)
+        _remember_assistant_message(assistant_message)
+        return assistant_message.id
+
+
+def _summarize_sources(sources: Optional[List[Dict[str, Any]]], chunks_retrieved: int):
+    """Return (sources JSON, relevance score) as stored on the assistant Message"""
+    sources_json = None
+    if sources:
+        simplified_sources = []
+        for source in sources[:5]:
+            simplified_sources.append({
+                "filename": source.get("filename"),
+                "document_id": source.get("document_id"),
+                "similarity_score": round(source.get("similarity_score", 0), 3),
+                "preview": source.get("chunk_preview", "")[:200]
+            })
+        sources_json = json.dumps(simplified_sources)
+
+    relevance_score = None
+    if chunks_retrieved > 0 and sources:
+        scores = [s.get("similarity_score", 0) for s in sources[:3]]
+        relevance_score = sum(scores) / len(scores) if scores else 0
+    return sources_json, relevance_score
+
+
+async def _cancel_on_disconnect(request: Request, awaitable: Awaitable):
+    """Await ``awaitable``, cancelling it (and the LLM call behind it) if the client disconnects"""
+    task = asyncio.ensure_future(awaitable)
+    while not task.done():
+        await asyncio.wait({task}, timeout=0.5)
+        if not task.done() and await request.is_disconnected():
+            task.cancel()
+            break
+    return await task
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/", response_model=ChatResponse)
+async def chat_with_rag(
+    chat_request: ChatRequest,
+    request: Request,
+    mode: Optional[str] = Query("rag", regex="^(rag|general)$"),  # mode controls RAG or General Chat
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """
+    Send a message and get AI response; mode controls RAG vs General chat
+    """
+    gemini_service = GeminiService()
+
+    conversation = _get_or_create_conversation(db, chat_request, current_user)
+    history = _load_history(db, conversation, mode)
+    _save_user_message(db, conversation, chat_request.message)
 
     try:
         if mode == "general":
             # General chat mode via Gemini API
-            response_text = await gemini_service.generate_general_response(chat_request.message)
+            response_text = await _cancel_on_disconnect(
+                request, gemini_service.generate_general_response(chat_request.message)
+            )
             assistant_message = Message(
                 conversation_id=conversation.id,
                 role="assistant",
@@ -77,6 +160,7 @@ async def chat_with_rag(
             db.add(assistant_message)
             conversation.updated_at = assistant_message.created_at
             db.commit()
+            _remember_assistant_message(assistant_message)
 
             return ChatResponse(
                 message=response_text,
@@ -87,28 +171,13 @@ async def chat_with_rag(
             )
         else:
             # RAG chat mode
-            rag_response = await rag_service.generate_rag_response(
-                chat_request.message, 
-                current_user.id
+            rag_response = await _cancel_on_disconnect(
+                request, rag_service.generate_rag_response(chat_request.message, current_user.id, history)
             )
 
-            sources_json = None
-            if rag_response.get("sources"):
-                simplified_sources = []
-                for source in rag_response["sources"][:5]:
-                    simplified_sources.append({
-                        "filename": source.get("filename"),
-                        "document_id": source.get("document_id"),
-                        "similarity_score": round(source.get("similarity_score", 0), 3),
-                        "preview": source.get("chunk_preview", "")[:200]
-                    })
-                sources_json = json.dumps(simplified_sources)
-
-            relevance_score = None
-            if rag_response.get("chunks_retrieved", 0) > 0:
-                if rag_response.get("sources"):
-                    scores = [s.get("similarity_score", 0) for s in rag_response["sources"][:3]]
-                    relevance_score = sum(scores) / len(scores) if scores else 0
+            sources_json, relevance_score = _summarize_sources(
+                rag_response.get("sources"), rag_response.get("chunks_retrieved", 0)
+            )
 
             assistant_message = Message(
                 conversation_id=conversation.id,
@@ -120,13 +189,15 @@ async def chat_with_rag(
             db.add(assistant_message)
             conversation.updated_at = assistant_message.created_at
             db.commit()
+            _remember_assistant_message(assistant_message)
 
             return ChatResponse(
                 message=rag_response["response"],
                 conversation_id=conversation.id,
                 sources=rag_response.get("sources", []),
                 context_used=rag_response.get("context_used", False),
-                chunks_retrieved=rag_response.get("chunks_retrieved", 0)
+                chunks_retrieved=rag_response.get("chunks_retrieved", 0),
+                prompt_tokens=rag_response.get("prompt_tokens")
             )
 
     except Exception as e:
@@ -138,6 +209,7 @@ async def chat_with_rag(
         )
         db.add(error_msg)
         db.commit()
+        _remember_assistant_message(error_msg)
         return ChatResponse(
             message=error_message,
             conversation_id=conversation.id,
@@ -147,6 +219,76 @@ async def chat_with_rag(
         )
 
 
+@router.post("/stream")
+async def chat_with_rag_stream(
+    chat_request: ChatRequest,
+    mode: Optional[str] = Query("rag", regex="^(rag|general)$"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """
+    Streaming variant of the chat endpoint using Server-Sent Events.
+
+    Emits ``conversation``, then ``sources``, then one ``token`` event per
+    generated chunk and finally ``done`` (or ``error``). The assistant
+    message is saved once the stream ends, including when the client
+    disconnects part way (then with the text streamed so far).
+    """
+    conversation = _get_or_create_conversation(db, chat_request, current_user)
+    history = _load_history(db, conversation, mode)
+    _save_user_message(db, conversation, chat_request.message)
+    conversation_id = conversation.id
+
+    async def event_stream():
+        yield _sse_event("conversation", {"conversation_id": conversation_id})
+        sources, chunks_retrieved = [], 0
+        response_text, failed, finished = "", False, False
+        streamed: List[str] = []
+        try:
+            async for event in rag_service.stream_rag_response(
+                chat_request.message, current_user.id, use_context=(mode == "rag"), history=history
+            ):
+                if event["type"] == "sources":
+                    sources, chunks_retrieved = event["sources"], event["chunks_retrieved"]
+                    yield _sse_event("sources", {
+                        "sources": sources,
+                        "context_used": event["context_used"],
+                        "chunks_retrieved": chunks_retrieved,
+                        "prompt_tokens": event["prompt_tokens"]
+                    })
+                elif event["type"] == "token":
+                    streamed.append(event["text"])
+                    yield _sse_event("token", {"text": event["text"]})
+                elif event["type"] == "done":
+                    response_text = event["response"]
+                else:
+                    response_text, failed = event["error"], True
+                    sources, chunks_retrieved = [], 0
+                    yield _sse_event("error", {"error": event["error"]})
+            finished = True
+        finally:
+            # Also runs when the client disconnects mid-stream, so the question never
+            # stays unanswered in the history; the partial answer is kept if there is one
+            if not finished:
+                response_text = "".join(streamed).strip() or "❌ Response interrupted before it finished"
+            message_id = _save_assistant_message(conversation_id, response_text, sources, chunks_retrieved)
+
+        if not failed:
+            yield _sse_event("done", {
+                "conversation_id": conversation_id,
+                "message_id": message_id,
+                "context_used": bool(sources),
+                "chunks_retrieved": chunks_retrieved
+            })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/conversations", response_model=List[ConversationSchema])
 async def get_conversations(
     skip: int = Query(0, ge=0),
@@ -203,7 +345,8 @@ async def get_conversation_messages(
 @router.get("/stats")
 async def get_chat_stats(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    rag_service: RAGService = Depends(get_rag_service)
 ):
     total_conversations = db.query(Conversation).filter(
         Conversation.user_id == current_user.id
@@ -225,5 +368,6 @@ async def get_chat_stats(
         "total_conversations": total_conversations,
         "total_messages": total_messages,
         "recent_conversations": recent_conversations,
+        "response_cache": rag_service.response_cache.get_stats(current_user.id),
         "user_id": current_user.id
     }
@@ -1,30 +1,102 @@
-from typing import List
+import json
+from typing import Any, Dict, List
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.db.database import get_db
-from app.models.models import User
-from app.schemas.schemas import Document as DocumentSchema, FileUploadResponse, DocumentStats
+from app.core.config import settings
+from app.db.database import get_db, SessionLocal
+from app.models.models import Document, User
+from app.schemas.schemas import (
+    Document as DocumentSchema, FileUploadResponse, DocumentStats,
+    IngestionJob as IngestionJobSchema, QueueStatus, DocumentProgress,
+    BulkUploadResponse, BatchProgress
+)
 from app.services.document_service import DocumentService
-from app.utils.dependencies import get_current_active_user
+from app.services.ingestion_queue import ingestion_queue
+from app.services.progress import progress_tracker, FINAL_STAGES
+from app.services.rag_service import RAGService
+from app.utils.dependencies import get_current_active_user, get_rag_service
 
 router = APIRouter()
 
+STATUS_STAGES = {"pending": "queued", "processing": "processing", "completed": "completed", "failed": "failed"}
+
+
+def _get_owned_document(db: Session, document_id: int, user_id: int) -> Document:
+    document = db.query(Document).filter(Document.id == document_id, Document.user_id == user_id).first()
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    return document
+
+
+def _document_progress(document_id: int, user_id: int, db: Session) -> Dict[str, Any]:
+    """Live progress if this process is running the job, else the status stored in the database"""
+    entry = progress_tracker.get(document_id)
+    if entry is not None and entry["user_id"] == user_id:
+        return DocumentProgress(**entry).model_dump()
+    document = db.query(Document).filter(Document.id == document_id, Document.user_id == user_id).first()
+    stage = STATUS_STAGES.get(document.processing_status, document.processing_status) if document else "failed"
+    percent = 100.0 if stage == "completed" else 0.0
+    if stage == "processing":
+        # Written by the worker's lease heartbeat, at most ingestion_heartbeat_seconds old
+        job = ingestion_queue.get_document_job(db, document_id)
+        percent = round(100.0 * (job.progress or 0.0), 1) if job else 0.0
+    return DocumentProgress(
+        document_id=document_id,
+        stage=stage,
+        percent=percent,
+        error=None if document else "Document no longer exists"
+    ).model_dump()
+
+
 @router.post("/upload", response_model=FileUploadResponse, status_code=status.HTTP_201_CREATED)
 async def upload_document(
     file: UploadFile = File(...),
+    priority: int = Query(0, ge=0, le=10, description="Higher values are processed first"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    rag_service: RAGService = Depends(get_rag_service)
 ):
     """Upload a new document for RAG processing"""
-    document_service = DocumentService(db)
-    document = await document_service.upload_and_process_document(file, current_user)
+    document_service = DocumentService(db, rag_service)
+    document, duplicate = await document_service.upload_and_process_document(file, current_user, priority=priority)
+
+    if duplicate:
+        return FileUploadResponse(
+            message=f"Document '{file.filename}' is identical to '{document.original_filename}', which is already in your knowledge base",
+            document=document,
+            duplicate=True
+        )
 
     return FileUploadResponse(
         message=f"Document '{file.filename}' uploaded successfully and is being processed",
         document=document
     )
 
+@router.post("/upload/bulk", response_model=BulkUploadResponse, status_code=status.HTTP_201_CREATED)
+async def bulk_upload_documents(
+    files: List[UploadFile] = File(..., description="Documents and/or ZIP archives of documents"),
+    priority: int = Query(0, ge=0, le=10, description="Higher values are processed first"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """Upload many documents (or ZIP archives) at once; track them with GET /batches/{batch_id}"""
+    document_service = DocumentService(db, rag_service)
+    result = await document_service.bulk_upload_documents(files, current_user, priority=priority)
+
+    return BulkUploadResponse(
+        message=(
+            f"{len(result['documents'])} documents queued for processing, "
+            f"{len(result['duplicates'])} already in your knowledge base, {len(result['skipped'])} skipped"
+        ),
+        **result
+    )
+
 @router.get("/", response_model=List[DocumentSchema])
 async def get_documents(
     skip: int = Query(0, ge=0, description="Number of documents to skip"),
@@ -46,6 +118,36 @@ async def get_document_stats(
     stats = document_service.get_document_stats(current_user.id)
     return DocumentStats(**stats)
 
+@router.get("/queue", response_model=QueueStatus)
+async def get_queue_status(
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of recent jobs to return"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get ingestion queue depth and the current user's recent jobs"""
+    return QueueStatus(
+        queue=ingestion_queue.get_queue_stats(db),
+        user_queue=ingestion_queue.get_queue_stats(db, user_id=current_user.id),
+        jobs=ingestion_queue.get_user_jobs(db, current_user.id, limit=limit)
+    )
+
+@router.get("/batches/{batch_id}", response_model=BatchProgress)
+async def get_batch_progress(
+    batch_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get aggregate ingestion progress for a bulk upload"""
+    progress = ingestion_queue.get_batch_progress(db, current_user.id, batch_id)
+
+    if not progress:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch not found"
+        )
+
+    return progress
+
 @router.get("/{document_id}", response_model=DocumentSchema)
 async def get_document(
     document_id: int,
@@ -68,10 +170,11 @@ async def get_document(
 async def delete_document(
     document_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    rag_service: RAGService = Depends(get_rag_service)
 ):
     """Delete a document and remove from RAG knowledge base"""
-    document_service = DocumentService(db)
+    document_service = DocumentService(db, rag_service)
     success = document_service.delete_document(document_id, current_user.id)
 
     if not success:
@@ -82,14 +185,82 @@ async def delete_document(
 
     return {"message": "Document deleted successfully and removed from knowledge base"}
 
+@router.get("/{document_id}/job", response_model=IngestionJobSchema)
+async def get_document_job(
+    document_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the latest ingestion job for a document"""
+    document_service = DocumentService(db)
+    document = document_service.get_document_by_id(document_id, current_user.id)
+    job = ingestion_queue.get_document_job(db, document_id) if document else None
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No ingestion job found for this document"
+        )
+
+    return job
+
+@router.get("/{document_id}/progress", response_model=DocumentProgress)
+async def get_document_progress(
+    document_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get ingestion progress (stage, pages, chunks, percent) for a document"""
+    _get_owned_document(db, document_id, current_user.id)
+    return _document_progress(document_id, current_user.id, db)
+
+@router.get("/{document_id}/progress/stream")
+async def stream_document_progress(
+    document_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Stream ingestion progress as Server-Sent Events until the document completes or fails"""
+    _get_owned_document(db, document_id, current_user.id)
+    user_id = current_user.id
+
+    async def event_stream():
+        last = None
+        while True:
+            if progress_tracker.get(document_id) is not None:
+                progress = _document_progress(document_id, user_id, db)
+            else:
+                # Queued, or running in another worker process: poll the stored status instead
+                poll_db = SessionLocal()
+                try:
+                    progress = _document_progress(document_id, user_id, poll_db)
+                finally:
+                    poll_db.close()
+            if progress != last:
+                yield f"event: progress\ndata: {json.dumps(progress)}\n\n"
+                last = progress
+            else:
+                yield ": keep-alive\n\n"
+            if progress["stage"] in FINAL_STAGES:
+                break
+            await progress_tracker.wait_for_update(document_id, timeout=settings.progress_heartbeat_seconds)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/{document_id}/reprocess")
 async def reprocess_document(
     document_id: int,
+    priority: int = Query(0, ge=0, le=10, description="Higher values are processed first"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    rag_service: RAGService = Depends(get_rag_service)
 ):
     """Reprocess a document (useful if processing failed)"""
-    document_service = DocumentService(db)
+    document_service = DocumentService(db, rag_service)
     document = document_service.get_document_by_id(document_id, current_user.id)
 
     if not document:
@@ -104,12 +275,6 @@ async def reprocess_document(
             detail="Document is already being processed"
         )
 
-    # Reset status and reprocess
-    document.processing_status = "pending"
-    db.commit()
-
-    # Process asynchronously
-    import asyncio
-    asyncio.create_task(document_service._process_document_async(document))
+    job = document_service.reprocess_document(document, priority=priority)
 
-    return {"message": "Document reprocessing started"}
+    return {"message": "Document queued for reprocessing", "job_id": job.id}
@@ -1,54 +1,15 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
-import asyncio
+from fastapi import APIRouter, BackgroundTasks
 
-router = APIRouter()
-
-# ModelLoader class for lazy model loading
-class ModelLoader:
-    def __init__(self):
-        self.model = None
-        self.loading = False
-        self.loaded = False
+from app.services.model_loader import model_loader
 
-    async def load_model(self):
-        if self.loaded:
-            return self.model
-        if self.loading:
-            while self.loading:
-                await asyncio.sleep(0.1)
-            return self.model
-        self.loading = True
-        try:
-            print("🤖 Loading AI model...")
-            # Replace the following sleep with your model loading code
-            await asyncio.sleep(2)
-            # Example:
-            # from sentence_transformers import SentenceTransformer
-            # self.model = SentenceTransformer('all-MiniLM-L6-v2')
-            
-            self.model = "AI Model Loaded"  # Replace with your actual model
-            self.loaded = True
-            print("✅ AI model loaded successfully!")
-            return self.model
-        except Exception as e:
-            print(f"❌ Failed to load model: {e}")
-            raise HTTPException(status_code=500, detail=f"Model loading failed: {str(e)}")
-        finally:
-            self.loading = False
-
-# Global model loader instance
-model_loader = ModelLoader()
+router = APIRouter()
 
 @router.get("/model/status")
 async def get_model_status():
     """
-    Endpoint to get current model loading status.
+    Endpoint to get current model loading status and warm-up timings.
     """
-    return {
-        "loaded": model_loader.loaded,
-        "loading": model_loader.loading,
-        "status": "loaded" if model_loader.loaded else "loading" if model_loader.loading else "not_loaded"
-    }
+    return model_loader.get_status()
 
 @router.post("/model/preload")
 async def preload_model(background_tasks: BackgroundTasks):
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -25,6 +25,39 @@ def get_db():
     finally:
         db.close()
 
+def upgrade_schema():
+    '''Add columns introduced after a table was first created (create_all skips existing tables)'''
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+    if "documents" not in tables:
+        return
+    columns = {column["name"] for column in inspector.get_columns("documents")}
+    if "content_hash" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE documents ADD COLUMN content_hash VARCHAR(64)"))
+            conn.execute(text("CREATE INDEX ix_documents_content_hash ON documents (content_hash)"))
+            # Existing rows keep NULL, which the unique index ignores
+            conn.execute(text(
+                "CREATE UNIQUE INDEX uq_documents_user_content_hash ON documents (user_id, content_hash)"
+            ))
+        print("✅ Added documents.content_hash for upload deduplication")
+
+    if "ingestion_jobs" in tables:
+        job_columns = {column["name"] for column in inspector.get_columns("ingestion_jobs")}
+        if "batch_id" not in job_columns:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE ingestion_jobs ADD COLUMN batch_id VARCHAR(36)"))
+                conn.execute(text("CREATE INDEX ix_ingestion_jobs_batch_id ON ingestion_jobs (batch_id)"))
+            print("✅ Added ingestion_jobs.batch_id for bulk uploads")
+
+    if "conversations" in tables:
+        conversation_columns = {column["name"] for column in inspector.get_columns("conversations")}
+        if "summary" not in conversation_columns:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE conversations ADD COLUMN summary TEXT"))
+                conn.execute(text("ALTER TABLE conversations ADD COLUMN summary_through_id INTEGER"))
+            print("✅ Added conversations.summary for conversation-aware chat")
+
 def test_connection():
     try:
         with engine.connect() as conn:
@@ -51,11 +51,13 @@ class Document(DocumentBase):
     original_filename: str
     file_path: str
     file_size: int
+    content_hash: Optional[str] = None
     processing_status: str
     document_type: str
     user_id: int
     created_at: datetime
     extracted_text: Optional[str] = None
+    doc_metadata: Optional[Dict[str, Any]] = None
 
     class Config:
         from_attributes = True
@@ -66,6 +68,46 @@ class DocumentStats(BaseModel):
     file_types: Dict[str, int]
     vector_stats: Dict[str, Any]
 
+# Ingestion queue schemas
+class IngestionJob(BaseModel):
+    id: int
+    document_id: int
+    batch_id: Optional[str] = None
+    status: str
+    priority: int
+    attempts: int
+    max_attempts: int
+    progress: float
+    next_run_at: datetime
+    last_error: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class QueueStatus(BaseModel):
+    queue: Dict[str, Any]
+    user_queue: Dict[str, Any]
+    jobs: List[IngestionJob]
+
+class DocumentProgress(BaseModel):
+    document_id: int
+    stage: str
+    percent: float = 0.0
+    pages_total: Optional[int] = None
+    pages_extracted: int = 0
+    chunks_embedded: int = 0
+    vectors_written: int = 0
+    error: Optional[str] = None
+    updated_at: Optional[float] = None
+
+class BatchProgress(BaseModel):
+    batch_id: str
+    total: int
+    statuses: Dict[str, int]
+    percent: float
+    documents: List[DocumentProgress]
+
 # Chat schemas
 class MessageBase(BaseModel):
     content: str
@@ -118,11 +160,24 @@ class ChatResponse(BaseModel):
     sources: Optional[List[Dict[str, Any]]] = None
     context_used: bool = False
     chunks_retrieved: int = 0
+    prompt_tokens: Optional[int] = None
 
 # File upload schemas
 class FileUploadResponse(BaseModel):
     message: str
     document: Document
+    duplicate: bool = False
+
+class SkippedFile(BaseModel):
+    filename: str
+    reason: str
+
+class BulkUploadResponse(BaseModel):
+    message: str
+    batch_id: Optional[str] = None
+    documents: List[Document]
+    duplicates: List[Document] = []
+    skipped: List[SkippedFile] = []
 
 class HealthResponse(BaseModel):
     status: str
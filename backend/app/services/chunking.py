@@ -0,0 +1,250 @@
+import re
+from typing import Callable, List, Optional
+
+from app.core.config import settings
+from app.services.tokens import count_tokens
+
+
+class IncrementalSplitter:
+    """Feeds text to a splitter piece by piece and emits chunks as they settle.
+
+    Everything but the last chunk of the buffer is final once more text
+    arrives, so it is emitted; the last chunk is carried over and re-split
+    with the next piece, which keeps chunk boundaries (and overlap) close to
+    what splitting the whole text at once would give.
+    """
+
+    def __init__(self, split_text: Callable[[str], List[str]], separator: str = "\n"):
+        self._split_text = split_text
+        self._separator = separator
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer = f"{self._buffer}{self._separator}{text}" if self._buffer else text
+        chunks = self._split_text(self._buffer)
+        if len(chunks) <= 1:
+            return []
+        self._buffer = chunks[-1]
+        return chunks[:-1]
+
+    def finish(self) -> List[str]:
+        chunks = self._split_text(self._buffer) if self._buffer.strip() else []
+        self._buffer = ""
+        return chunks
+
+
+class RecursiveSplitter:
+    """Pure-Python equivalent of langchain's RecursiveCharacterTextSplitter.
+
+    Splits on the first separator present in the text, merges the pieces up
+    to ``chunk_size`` (as measured by ``length_function``) with up to
+    ``chunk_overlap`` carried between chunks, and recurses with the next
+    separator into pieces that are still too long. Separators are kept at
+    the start of the piece that follows them.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200,
+                 length_function: Callable[[str], int] = len,
+                 separators: Optional[List[str]] = None):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_function = length_function
+        self.separators = separators if separators is not None else ["\n\n", "\n", " ", ""]
+
+    def split_text(self, text: str) -> List[str]:
+        return self._split(text, self.separators)
+
+    @staticmethod
+    def _split_keeping_separator(text: str, separator: str) -> List[str]:
+        if not separator:
+            return list(text)
+        parts = text.split(separator)
+        pieces = [parts[0]] + [separator + part for part in parts[1:]]
+        return [piece for piece in pieces if piece]
+
+    def _split(self, text: str, separators: List[str]) -> List[str]:
+        separator, remaining = separators[-1], []
+        for index, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if candidate in text:
+                separator, remaining = candidate, separators[index + 1:]
+                break
+
+        chunks: List[str] = []
+        small: List[str] = []
+        for piece in self._split_keeping_separator(text, separator):
+            if self.length_function(piece) < self.chunk_size:
+                small.append(piece)
+                continue
+            if small:
+                chunks.extend(self._merge(small))
+                small = []
+            if remaining:
+                chunks.extend(self._split(piece, remaining))
+            else:
+                chunks.append(piece)
+        if small:
+            chunks.extend(self._merge(small))
+        return chunks
+
+    def _merge(self, pieces: List[str]) -> List[str]:
+        """Greedily pack pieces into chunks, starting each new chunk with up to ``chunk_overlap`` of the last"""
+        chunks: List[str] = []
+        current: List[str] = []
+        lengths: List[int] = []
+        total = 0
+        for piece in pieces:
+            length = self.length_function(piece)
+            if current and total + length > self.chunk_size:
+                chunk = "".join(current).strip()
+                if chunk:
+                    chunks.append(chunk)
+                while current and (total > self.chunk_overlap or total + length > self.chunk_size):
+                    total -= lengths.pop(0)
+                    current.pop(0)
+            current.append(piece)
+            lengths.append(length)
+            total += length
+        chunk = "".join(current).strip()
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+
+# Sentence ends: terminal punctuation (plus closing quotes/brackets) then whitespace, or a blank line.
+# Matching starts on the single candidate character so the scan stays fast.
+SENTENCE_BOUNDARY = re.compile(r"[.!?\n](?:(?<=[.!?])[.!?\"')\]]*\s+|(?<=\n)[ \t]*\n\s*)")
+ABBREVIATIONS = frozenset("e.g i.e etc vs mr mrs ms dr prof st no fig eq al approx dept inc ltd jr sr".split())
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, each keeping its trailing whitespace so they re-join losslessly"""
+    sentences = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        end = match.end()
+        if "\n" not in match.group():
+            # Not after abbreviations or initials, nor before a lowercase continuation
+            before = text[max(start, match.start() - 32):match.start()].split()
+            word = before[-1].lower() if before else ""
+            if word in ABBREVIATIONS or len(word) == 1:
+                continue
+            if end < len(text) and text[end].islower():
+                continue
+        sentences.append(text[start:end])
+        start = end
+    if start < len(text):
+        sentences.append(text[start:])
+    return [sentence for sentence in sentences if sentence.strip()]
+
+
+class SentenceSplitter(RecursiveSplitter):
+    """Packs whole sentences into chunks; only sentences longer than a chunk are cut"""
+
+    def split_text(self, text: str) -> List[str]:
+        chunks: List[str] = []
+        small: List[str] = []
+        for sentence in split_sentences(text):
+            if self.length_function(sentence) < self.chunk_size:
+                small.append(sentence)
+                continue
+            if small:
+                chunks.extend(self._merge(small))
+                small = []
+            chunks.extend(self._split(sentence, ["\n", " ", ""]))
+        if small:
+            chunks.extend(self._merge(small))
+        return chunks
+
+
+# Markdown-style headings (DOCX headings are extracted this way), numbered section titles,
+# short ALL-CAPS lines and the page markers written for OCR'd PDF pages
+HEADING_LINE = re.compile(
+    r"^[ \t]*(?:#{1,6}[ \t]+\S[^\n]*"
+    r"|\d+(?:\.\d+)*\.?[ \t]+[A-Z][^\n.!?]{0,80}"
+    r"|[A-Z][A-Z0-9 ,&:()'/-]{2,80}"
+    r"|--- Page \d+ ---)[ \t]*$",
+    re.MULTILINE
+)
+PAGE_BREAK = "\f"
+
+
+class StructureSplitter:
+    """Heading- and page-aware chunking.
+
+    Text is cut into sections at headings and page breaks (``\\f``, which the
+    ingestion pipeline puts between PDF pages), each section is chunked with
+    ``splitter``, and chunks never span two sections unless the earlier one
+    is shorter than ``min_size``: such a section (e.g. a heading with one
+    line under it) is prepended to the next before that one is split. A
+    short last section is appended to the previous chunk when it fits.
+    """
+
+    segment_separator = PAGE_BREAK
+
+    def __init__(self, splitter: RecursiveSplitter, min_size: int = 200):
+        self.splitter = splitter
+        self.min_size = min_size
+
+    @staticmethod
+    def sections(text: str) -> List[str]:
+        sections = []
+        for page in text.split(PAGE_BREAK):
+            starts = [match.start() for match in HEADING_LINE.finditer(page) if match.start() > 0]
+            for start, end in zip([0] + starts, starts + [len(page)]):
+                if page[start:end].strip():
+                    sections.append(page[start:end])
+        return sections
+
+    def split_text(self, text: str) -> List[str]:
+        length = self.splitter.length_function
+        chunks: List[str] = []
+        carried = ""
+        for section in self.sections(text):
+            if carried:
+                section = f"{carried.rstrip()}\n{section}"
+            if length(section.strip()) < self.min_size:
+                carried = section
+                continue
+            carried = ""
+            chunks.extend(self.splitter.split_text(section))
+        if carried:
+            # Nothing follows a short last section; append it to the previous chunk if that fits
+            if chunks and length(f"{chunks[-1]}\n{carried.strip()}") <= self.splitter.chunk_size:
+                chunks[-1] = f"{chunks[-1]}\n{carried.strip()}"
+            else:
+                chunks.extend(self.splitter.split_text(carried))
+        return chunks
+
+
+CHUNK_STRATEGIES = ("recursive", "token", "sentence", "structure")
+
+
+def create_splitter(strategy: str):
+    """Splitter for a chunking strategy, sized from settings"""
+    strategy = (strategy or "recursive").lower()
+    if strategy == "recursive":
+        return RecursiveSplitter(settings.chunk_size, settings.chunk_overlap)
+    if strategy == "token":
+        return RecursiveSplitter(settings.chunk_tokens, settings.chunk_token_overlap, length_function=count_tokens)
+    if strategy == "sentence":
+        return SentenceSplitter(settings.chunk_size, settings.chunk_overlap)
+    if strategy == "structure":
+        return StructureSplitter(SentenceSplitter(settings.chunk_size, settings.chunk_overlap), settings.chunk_min_size)
+    raise ValueError(f"Unknown chunking strategy: {strategy} (expected one of {', '.join(CHUNK_STRATEGIES)})")
+
+
+def validate_chunk_strategies():
+    """Build every configured splitter once so bad settings fail at startup rather than per document"""
+    for strategy in {settings.chunk_default_strategy, *(
+        entry.split(":", 1)[1] for entry in settings.chunk_strategies.split(",") if ":" in entry
+    )}:
+        create_splitter(strategy.strip())
+
+
+def splitter_for_file_type(file_type: str):
+    return create_splitter(settings.chunk_strategy_for(file_type))
@@ -0,0 +1,126 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def file_md5(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """MD5 of a file on disk, read in blocks (same digest as the upload path)"""
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ContentCache:
+    """Content-addressed cache for ingestion output, stored in a local SQLite file.
+
+    Extracted text is keyed by the file's MD5 and only served while its
+    ``text_version`` matches the extractors'; chunk embeddings are keyed by
+    SHA-256 of the embedding model name plus the chunk text. Re-uploads and
+    reprocessing of identical content therefore skip extraction and only
+    embed chunks that actually changed.
+    """
+
+    def __init__(self, path: str, model_name: str, max_embeddings: int = 500_000, text_version: int = 1):
+        self.model_name = model_name
+        self.text_version = text_version
+        self.max_embeddings = max_embeddings
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extracted_text ("
+            "file_hash TEXT PRIMARY KEY, file_type TEXT, text TEXT NOT NULL, created_at REAL, "
+            "version INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(extracted_text)")}
+        if "version" not in columns:
+            self._conn.execute("ALTER TABLE extracted_text ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_chunk_embeddings_last_used ON chunk_embeddings (last_used)")
+        self._conn.commit()
+        self._puts_since_prune = 0
+
+    def _chunk_key(self, chunk: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{chunk}".encode("utf-8")).hexdigest()
+
+    def get_text(self, file_hash: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM extracted_text WHERE file_hash = ? AND version = ?",
+                (file_hash, self.text_version)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_text(self, file_hash: str, file_type: str, text: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extracted_text (file_hash, file_type, text, created_at, version) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file_hash, file_type, text, time.time(), self.text_version)
+            )
+            self._conn.commit()
+
+    def get_embeddings(self, chunks: List[str]) -> Dict[int, np.ndarray]:
+        """Return cached vectors by chunk position for the chunks that hit"""
+        keys = [self._chunk_key(chunk) for chunk in chunks]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM chunk_embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE chunk_embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return {i: found[key] for i, key in enumerate(keys) if key in found}
+
+    def put_embeddings(self, chunks: List[str], vectors: np.ndarray):
+        now = time.time()
+        rows = [
+            (self._chunk_key(chunk), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for chunk, vector in zip(chunks, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunk_embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._puts_since_prune += len(rows)
+            if self._puts_since_prune >= 1000:
+                self._prune()
+            self._conn.commit()
+
+    def _prune(self):
+        self._puts_since_prune = 0
+        count = self._conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0]
+        excess = count - self.max_embeddings
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM chunk_embeddings WHERE key IN "
+                "(SELECT key FROM chunk_embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+            logger.info(f"🧹 Pruned {excess} cached chunk embeddings")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,128 @@
+import re
+from typing import Any, Dict, List, Set
+
+from app.services.tokens import count_tokens, truncate_tokens
+
+WORD_PATTERN = re.compile(r"\w+")
+# Where the start of the next chunk is looked for inside the previous one
+OVERLAP_PROBE_CHARS = 32
+# A block cut below this many tokens isn't worth its "Source:" header
+MIN_TRUNCATED_TOKENS = 64
+
+
+def _join_overlapping(first: str, second: str) -> str:
+    """Concatenate consecutive chunks, dropping the text the splitter repeated between them"""
+    if second in first:
+        return first
+    probe = second[:OVERLAP_PROBE_CHARS]
+    start = max(0, len(first) - len(second))
+    position = first.find(probe, start)
+    while position != -1:
+        if second.startswith(first[position:]):
+            return first[:position] + second
+        position = first.find(probe, position + 1)
+    return f"{first}\n{second}"
+
+
+def _shingles(text: str, size: int = 3) -> Set[str]:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _similarity(a: Set[str], b: Set[str]) -> float:
+    """Overlap coefficient, so a chunk already contained in a merged block counts as a duplicate"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def merge_adjacent_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Group chunks into blocks of consecutive ``chunk_index`` runs per ``document_id``.
+
+    Blocks come back in relevance order (the position of their best chunk in
+    ``chunks``), with text in document order and overlaps removed.
+    """
+    by_document: Dict[Any, List[tuple]] = {}
+    for position, chunk in enumerate(chunks):
+        by_document.setdefault(chunk["metadata"].get("document_id"), []).append((position, chunk))
+
+    blocks = []
+    for members in by_document.values():
+        members.sort(key=lambda member: member[1]["metadata"].get("chunk_index", 0))
+        run = [members[0]]
+        for member in members[1:]:
+            previous = run[-1][1]["metadata"].get("chunk_index")
+            current = member[1]["metadata"].get("chunk_index")
+            if previous is not None and current is not None and current - previous <= 1:
+                run.append(member)
+            else:
+                blocks.append(_make_block(run))
+                run = [member]
+        blocks.append(_make_block(run))
+    blocks.sort(key=lambda block: block["position"])
+    return blocks
+
+
+def _make_block(run: List[tuple]) -> Dict[str, Any]:
+    chunks = [chunk for _, chunk in run]
+    text = chunks[0]["text"]
+    for chunk in chunks[1:]:
+        text = _join_overlapping(text, chunk["text"])
+    block = {
+        "position": min(position for position, _ in run),
+        "ids": [chunk["id"] for chunk in chunks],
+        "metadata": chunks[0]["metadata"],
+        "text": text,
+        "similarity_score": max(chunk.get("similarity_score", 0.0) for chunk in chunks),
+    }
+    rerank_scores = [chunk["rerank_score"] for chunk in chunks if "rerank_score" in chunk]
+    if rerank_scores:
+        block["rerank_score"] = max(rerank_scores)
+    return block
+
+
+def build_context(chunks: List[Dict[str, Any]], token_budget: int,
+                  dedup_threshold: float = 0.85) -> Dict[str, Any]:
+    """Merge, de-duplicate and pack retrieved chunks into at most ``token_budget`` tokens.
+
+    Returns the context string, the blocks that made it in, and counts of
+    what was merged, dropped and truncated along the way.
+    """
+    blocks = merge_adjacent_chunks(chunks)
+    selected: List[Dict[str, Any]] = []
+    seen: List[Set[str]] = []
+    parts: List[str] = []
+    used = duplicates = truncated = skipped = 0
+    for block in blocks:
+        shingles = _shingles(block["text"])
+        if any(_similarity(shingles, other) >= dedup_threshold for other in seen):
+            duplicates += 1
+            continue
+        header = f"Source: {block['metadata'].get('filename', 'unknown')}\n"
+        # Blocks are joined by a blank line, roughly one token
+        overhead = count_tokens(header) + (1 if parts else 0)
+        tokens = count_tokens(block["text"])
+        remaining = token_budget - used - overhead
+        if tokens > remaining:
+            if remaining < MIN_TRUNCATED_TOKENS:
+                skipped += 1
+                continue
+            block = {**block, "text": truncate_tokens(block["text"], remaining)}
+            tokens = count_tokens(block["text"])
+            truncated += 1
+        seen.append(shingles)
+        selected.append(block)
+        parts.append(header + block["text"])
+        used += overhead + tokens
+
+    return {
+        "context": "\n\n".join(parts),
+        "blocks": selected,
+        "context_tokens": used,
+        "chunks_merged": sum(len(block["ids"]) - 1 for block in blocks),
+        "duplicates_dropped": duplicates,
+        "blocks_truncated": truncated,
+        "blocks_skipped": skipped,
+    }
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.models import Conversation, Message
+from app.services.llm_client import get_llm_client
+from app.services.tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Most turns folded into the summary by one LLM call; a longer backlog takes several
+SUMMARY_MAX_FOLD = 40
+
+
+@dataclass
+class ConversationHistory:
+    """Prior turns of a conversation as used for one request"""
+
+    summary: Optional[str] = None
+    # (role, content), oldest first, excluding the question being asked
+    messages: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not self.summary and not self.messages
+
+    def retrieval_query(self, query: str) -> str:
+        """The question followed by the last few user questions, so follow-ups retrieve on-topic.
+
+        The current question comes first: the embedding model truncates long
+        inputs from the end, so older context is what gets cut.
+        """
+        previous = [content for role, content in self.messages if role == "user"][-settings.history_query_turns:]
+        if not previous:
+            return query
+        context = truncate_tokens(" ".join(reversed(previous)), settings.history_query_max_tokens)
+        return f"{query}\n{context}"
+
+    def render(self, token_budget: int) -> str:
+        """Summary plus as many recent turns as fit in ``token_budget`` tokens"""
+        lines: List[str] = []
+        used = 0
+        for role, content in reversed(self.messages):
+            text = truncate_tokens(content, settings.history_message_max_tokens)
+            line = f"{'User' if role == 'user' else 'Assistant'}: {text}"
+            tokens = count_tokens(line)
+            if used + tokens > token_budget:
+                break
+            lines.append(line)
+            used += tokens
+        lines.reverse()
+        if self.summary:
+            summary = truncate_tokens(self.summary, max(0, token_budget - used))
+            if summary:
+                lines.insert(0, f"Summary of earlier conversation: {summary}")
+        return "\n".join(lines)
+
+
+@dataclass
+class _ConversationState:
+    summary: Optional[str]
+    summary_through_id: int
+    # (message id, role, content) newer than summary_through_id, oldest first
+    messages: List[Tuple[int, str, str]]
+    loaded_at: float
+
+
+class ConversationMemory:
+    """Recent turns and rolling summary per conversation, cached in process.
+
+    A cold load is one query on ``messages`` (by ``conversation_id``, newest
+    ids first, limited), after which new messages are appended as the chat
+    endpoints save them. Turns that fall out of the verbatim window are
+    folded into ``Conversation.summary`` by the LLM in the background, a few
+    at a time, so the history part of the prompt stays roughly constant.
+    A cached entry is checked against the newest message id and summary
+    position in the database on every load (one indexed ``max`` query), so
+    turns saved or summarized by other worker processes are picked up; idle
+    entries expire after ``conversation_cache_ttl_seconds``.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: int = 600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, _ConversationState]" = OrderedDict()
+        self._summarizing: Set[int] = set()
+        # Running summary tasks; the event loop alone only holds weak references
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def _window(self) -> int:
+        # Verbatim turns plus the overflow waiting to be summarized
+        return settings.history_turns + max(1, settings.history_summary_batch)
+
+    def _get(self, conversation_id: int) -> Optional[_ConversationState]:
+        state = self._entries.get(conversation_id)
+        if state is None:
+            return None
+        if time.time() - state.loaded_at > self.ttl_seconds:
+            del self._entries[conversation_id]
+            return None
+        self._entries.move_to_end(conversation_id)
+        return state
+
+    def _put(self, conversation_id: int, state: _ConversationState):
+        self._entries[conversation_id] = state
+        self._entries.move_to_end(conversation_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read(self, db: Session, conversation: Conversation, limit: Optional[int] = None) -> _ConversationState:
+        """Messages after the summary, the newest ``limit`` of them (all when None)"""
+        through = conversation.summary_through_id or 0
+        query = (
+            db.query(Message.id, Message.role, Message.content)
+            .filter(Message.conversation_id == conversation.id, Message.id > through)
+            .order_by(Message.id.desc())
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        rows = query.all()
+        return _ConversationState(
+            summary=conversation.summary,
+            summary_through_id=through,
+            messages=[(row.id, row.role, row.content) for row in reversed(rows)],
+            loaded_at=time.time()
+        )
+
+    def load(self, db: Session, conversation: Conversation) -> ConversationHistory:
+        """History for the next question; call before that question is saved"""
+        with self._lock:
+            state = self._get(conversation.id)
+        if state is not None and not self._current(db, conversation, state):
+            state = None
+        if state is None:
+            state = self._read(db, conversation, self._window)
+            with self._lock:
+                self._put(conversation.id, state)
+        # Failed answers are stored for the UI but carry nothing worth resending
+        messages = [
+            (role, content) for _, role, content in state.messages[-settings.history_turns:]
+            if not content.startswith("❌")
+        ]
+        return ConversationHistory(summary=state.summary, messages=messages)
+
+    @staticmethod
+    def _current(db: Session, conversation: Conversation, state: _ConversationState) -> bool:
+        """Whether a cached entry still matches the database"""
+        if (conversation.summary_through_id or 0) != state.summary_through_id:
+            return False
+        newest = db.query(func.max(Message.id)).filter(Message.conversation_id == conversation.id).scalar() or 0
+        cached = state.messages[-1][0] if state.messages else state.summary_through_id
+        return newest == cached
+
+    def append(self, conversation_id: int, message_id: int, role: str, content: str):
+        with self._lock:
+            state = self._get(conversation_id)
+            if state is None:
+                return
+            state.messages.append((message_id, role, content))
+            del state.messages[:-self._window]
+
+    def schedule_summary(self, conversation_id: int):
+        """Fold turns that left the window into the summary, without blocking the caller"""
+        if not settings.history_summary_enabled or not get_llm_client().available:
+            return
+        with self._lock:
+            state = self._get(conversation_id)
+            # Only conversations answered with history in this process have an entry
+            if state is None or len(state.messages) < self._window:
+                return
+            if conversation_id in self._summarizing:
+                return
+            self._summarizing.add(conversation_id)
+        task = asyncio.get_running_loop().create_task(self._summarize(conversation_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, conversation_id: int):
+        try:
+            with SessionLocal() as db:
+                conversation = db.get(Conversation, conversation_id)
+                if conversation is None:
+                    return
+                # Everything after the summary, not just the cached window
+                state = self._read(db, conversation)
+                overflow = state.messages[:-settings.history_turns][:SUMMARY_MAX_FOLD]
+                if len(overflow) < settings.history_summary_batch:
+                    return
+                transcript = "\n".join(
+                    f"{'User' if role == 'user' else 'Assistant'}: "
+                    f"{truncate_tokens(content, settings.history_message_max_tokens)}"
+                    for _, role, content in overflow if not content.startswith("❌")
+                )
+                prompt = f"""Update the running summary of a conversation between a user and an assistant about the user's documents.
+
+Current summary:
+{state.summary or "(none)"}
+
+New turns:
+{transcript}
+
+Write the updated summary in at most {settings.history_summary_max_tokens} tokens. Keep names, numbers, documents and open questions the user may refer back to. Reply with the summary only."""
+                summary = await get_llm_client().generate(prompt)
+                state.summary = truncate_tokens(summary.strip(), settings.history_summary_max_tokens)
+                state.summary_through_id = overflow[-1][0]
+                state.messages = state.messages[len(overflow):]
+                conversation.summary = state.summary
+                conversation.summary_through_id = state.summary_through_id
+                db.commit()
+            with self._lock:
+                # Keep messages appended while the LLM call was in flight
+                cached = self._entries.get(conversation_id)
+                newest = state.messages[-1][0] if state.messages else state.summary_through_id
+                if cached is not None:
+                    state.messages.extend(message for message in cached.messages if message[0] > newest)
+                del state.messages[:-self._window]
+                self._put(conversation_id, state)
+            logger.info(f"📝 Summarized {len(overflow)} messages of conversation {conversation_id}")
+        except Exception as e:
+            logger.error(f"❌ Conversation summary failed for {conversation_id}: {e}")
+        finally:
+            with self._lock:
+                self._summarizing.discard(conversation_id)
+
+
+conversation_memory = ConversationMemory(
+    max_entries=settings.conversation_cache_max_entries,
+    ttl_seconds=settings.conversation_cache_ttl_seconds
+)
@@ -1,39 +1,50 @@
 import os
-import hashlib
+import uuid
 import asyncio
+import hashlib
+import tempfile
+import zipfile
 import aiofiles
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from fastapi import UploadFile, HTTPException, status
 
 from app.models.models import Document, User
 from app.core.config import settings
+from app.services.ingestion_queue import ingestion_queue
 from app.services.rag_service import RAGService
+from app.services.vector_store import get_vector_store
 
 
 class DocumentService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, rag_service: Optional[RAGService] = None):
+        """``rag_service`` is only needed to delete documents; reads work without the model loaded"""
         self.db = db
-        self.rag_service = RAGService()
+        self.rag_service = rag_service
 
-    async def upload_and_process_document(self, file: UploadFile, user: User) -> Document:
-        """Upload and process document with RAG integration"""
-        await self._validate_file(file)
+    async def upload_and_process_document(self, file: UploadFile, user: User, priority: int = 0) -> Tuple[Document, bool]:
+        """Upload and process document with RAG integration.
 
-        content = await file.read()
-        await file.seek(0)
+        Returns (document, duplicate); a repeat upload of content the user
+        already has returns the existing document without reprocessing.
+        """
+        await self._validate_file(file)
 
-        file_hash = hashlib.md5(content).hexdigest()
         file_extension = file.filename.split('.')[-1].lower()
-        unique_filename = f"{user.id}_{file_hash}.{file_extension}"
-
         user_upload_dir = os.path.join(settings.upload_path, str(user.id))
         os.makedirs(user_upload_dir, exist_ok=True)
 
-        file_path = os.path.join(user_upload_dir, unique_filename)
+        temp_path, file_hash, file_size = await self._stream_to_temp_file(file, user_upload_dir)
 
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
+        existing = self.get_document_by_hash(user.id, file_hash)
+        if existing:
+            os.remove(temp_path)
+            return existing, True
+
+        unique_filename = f"{user.id}_{file_hash}.{file_extension}"
+        file_path = os.path.join(user_upload_dir, unique_filename)
+        os.replace(temp_path, file_path)
 
         document_type = "image" if file_extension in ['png', 'jpg', 'jpeg'] else "text"
 
@@ -41,19 +52,228 @@ class DocumentService:
             filename=unique_filename,
             original_filename=file.filename,
             file_path=file_path,
-            file_size=len(content),
+            file_size=file_size,
             file_type=file_extension,
+            content_hash=file_hash,
             document_type=document_type,
             user_id=user.id,
             processing_status="pending"
         )
         self.db.add(db_document)
-        self.db.commit()
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # A concurrent upload of the same content won the unique index
+            self.db.rollback()
+            existing = self.get_document_by_hash(user.id, file_hash)
+            if existing:
+                return existing, True
+            raise
         self.db.refresh(db_document)
 
-        asyncio.create_task(self._process_document_async(db_document))
+        ingestion_queue.enqueue(self.db, db_document, priority=priority)
 
-        return db_document
+        return db_document, False
+
+    async def bulk_upload_documents(self, files: List[UploadFile], user: User, priority: int = 0) -> Dict[str, Any]:
+        """Upload many files and/or ZIP archives in one request.
+
+        Every file is streamed to disk and hashed (archive members are
+        decompressed one at a time), then all new ``Document`` rows and their
+        ingestion jobs are committed in a single transaction under one batch id.
+        Files already in the user's knowledge base come back as duplicates;
+        unsupported or oversized files are skipped with a reason.
+        """
+        user_upload_dir = os.path.join(settings.upload_path, str(user.id))
+        os.makedirs(user_upload_dir, exist_ok=True)
+
+        staged: List[Dict[str, Any]] = []
+        skipped: List[Dict[str, str]] = []
+        try:
+            for file in files:
+                filename = file.filename or ""
+                extension = filename.split('.')[-1].lower() if '.' in filename else ""
+                if extension == "zip":
+                    await self._stage_archive(file, user_upload_dir, staged, skipped)
+                    continue
+                reason = self._skip_reason(filename, file.size)
+                if reason:
+                    skipped.append({"filename": filename, "reason": reason})
+                    continue
+                try:
+                    temp_path, file_hash, file_size = await self._stream_to_temp_file(file, user_upload_dir)
+                except HTTPException as e:
+                    skipped.append({"filename": filename, "reason": e.detail})
+                    continue
+                staged.append({"filename": filename, "temp_path": temp_path, "hash": file_hash, "size": file_size})
+                if len(staged) > settings.bulk_max_files:
+                    raise self._too_many_files()
+
+            return self._register_batch(staged, skipped, user, user_upload_dir, priority)
+        finally:
+            for item in staged:
+                if os.path.exists(item["temp_path"]):
+                    os.remove(item["temp_path"])
+
+    async def _stage_archive(self, file: UploadFile, directory: str, staged: List[Dict[str, Any]],
+                             skipped: List[Dict[str, str]]):
+        """Stream a ZIP upload to disk, then extract its supported members to temp files"""
+        try:
+            archive_path, _, _ = await self._stream_to_temp_file(
+                file, directory, max_bytes=settings.bulk_max_archive_bytes
+            )
+        except HTTPException as e:
+            skipped.append({"filename": file.filename, "reason": e.detail})
+            return
+        try:
+            loop = asyncio.get_running_loop()
+            members, member_skips = await loop.run_in_executor(
+                None, self._extract_archive, archive_path, directory, settings.bulk_max_files - len(staged)
+            )
+        except zipfile.BadZipFile:
+            skipped.append({"filename": file.filename, "reason": "Not a valid ZIP archive"})
+            return
+        finally:
+            os.remove(archive_path)
+        staged.extend(members)
+        skipped.extend(member_skips)
+
+    def _extract_archive(self, archive_path: str, directory: str, max_files: int):
+        """Decompress archive members one at a time, hashing and size-checking the actual bytes"""
+        members, skipped = [], []
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                for info in archive.infolist():
+                    name = info.filename
+                    basename = os.path.basename(name)
+                    if info.is_dir() or name.startswith("__MACOSX/") or basename.startswith("."):
+                        continue
+                    reason = self._skip_reason(basename, info.file_size)
+                    if reason:
+                        skipped.append({"filename": name, "reason": reason})
+                        continue
+                    if len(members) >= max_files:
+                        raise self._too_many_files()
+
+                    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+                    file_hash = hashlib.md5()
+                    file_size = 0
+                    try:
+                        with os.fdopen(fd, 'wb') as out, archive.open(info) as src:
+                            for chunk in iter(lambda: src.read(settings.upload_chunk_size), b""):
+                                file_size += len(chunk)
+                                if file_size > settings.max_file_size_bytes:
+                                    break
+                                file_hash.update(chunk)
+                                out.write(chunk)
+                    except BaseException:
+                        os.remove(temp_path)
+                        raise
+                    if file_size > settings.max_file_size_bytes:
+                        os.remove(temp_path)
+                        skipped.append({"filename": name, "reason": self._file_too_large().detail})
+                        continue
+                    members.append({
+                        "filename": name[-255:], "temp_path": temp_path,
+                        "hash": file_hash.hexdigest(), "size": file_size
+                    })
+        except BaseException:
+            for member in members:
+                os.remove(member["temp_path"])
+            raise
+        return members, skipped
+
+    def _register_batch(self, staged: List[Dict[str, Any]], skipped: List[Dict[str, str]], user: User,
+                        directory: str, priority: int) -> Dict[str, Any]:
+        """Create Document rows and ingestion jobs for all new content in one transaction"""
+        existing = {}
+        hashes = list({item["hash"] for item in staged})
+        for start in range(0, len(hashes), 500):
+            for document in (
+                self.db.query(Document)
+                .filter(Document.user_id == user.id, Document.content_hash.in_(hashes[start:start + 500]))
+                .all()
+            ):
+                existing[document.content_hash] = document
+
+        new_documents, moves, duplicates, batch_hashes = [], [], [], set()
+        for item in staged:
+            if item["hash"] in existing:
+                duplicates.append(existing[item["hash"]])
+                continue
+            if item["hash"] in batch_hashes:
+                skipped.append({"filename": item["filename"], "reason": "Duplicate of another file in this upload"})
+                continue
+            batch_hashes.add(item["hash"])
+
+            file_extension = item["filename"].split('.')[-1].lower()
+            unique_filename = f"{user.id}_{item['hash']}.{file_extension}"
+            file_path = os.path.join(directory, unique_filename)
+            moves.append((item["temp_path"], file_path))
+            new_documents.append(Document(
+                filename=unique_filename,
+                original_filename=item["filename"],
+                file_path=file_path,
+                file_size=item["size"],
+                file_type=file_extension,
+                content_hash=item["hash"],
+                document_type="image" if file_extension in ['png', 'jpg', 'jpeg'] else "text",
+                user_id=user.id,
+                processing_status="pending"
+            ))
+
+        batch_id = None
+        if new_documents:
+            batch_id = str(uuid.uuid4())
+            self.db.add_all(new_documents)
+            try:
+                self.db.flush()
+            except IntegrityError:
+                # A concurrent upload registered some of this content first; its files
+                # may already sit at our final paths, so nothing is moved (the caller
+                # removes the temp files)
+                self.db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Some files were uploaded concurrently by another request; please retry"
+                )
+            # Files reach their final paths only once the rows are known to be ours,
+            # and before the jobs are committed so no worker sees a missing file
+            moved = []
+            try:
+                for temp_path, file_path in moves:
+                    os.replace(temp_path, file_path)
+                    moved.append(file_path)
+                ingestion_queue.enqueue_many(self.db, new_documents, priority=priority, batch_id=batch_id)
+            except BaseException:
+                self.db.rollback()
+                for file_path in moved:
+                    os.remove(file_path)
+                raise
+
+        return {
+            "batch_id": batch_id,
+            "documents": new_documents,
+            "duplicates": duplicates,
+            "skipped": skipped,
+        }
+
+    def _skip_reason(self, filename: str, size: Optional[int]) -> Optional[str]:
+        """Why a file in a bulk upload cannot be ingested, or None if it can"""
+        if not filename:
+            return "No file name"
+        extension = filename.split('.')[-1].lower()
+        if extension not in settings.allowed_file_types_list:
+            return f"File type not allowed. Supported types: {', '.join(settings.allowed_file_types_list)}"
+        if size is not None and size > settings.max_file_size_bytes:
+            return self._file_too_large().detail
+        return None
+
+    def _too_many_files(self) -> HTTPException:
+        return HTTPException(
+            status_code=400,
+            detail=f"Too many files. Maximum per bulk upload: {settings.bulk_max_files}"
+        )
 
     async def _validate_file(self, file: UploadFile):
         """Validate uploaded file"""
@@ -67,27 +287,48 @@ class DocumentService:
                 detail=f"File type not allowed. Supported types: {', '.join(settings.allowed_file_types_list)}"
             )
 
-        content = await file.read()
-        await file.seek(0)
+        # Reject early when the client declared the size up front
+        if file.size is not None and file.size > settings.max_file_size_bytes:
+            raise self._file_too_large()
 
-        if len(content) > settings.max_file_size_bytes:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Maximum size: {settings.max_file_size_mb}MB"
-            )
+    async def _stream_to_temp_file(self, file: UploadFile, directory: str, max_bytes: Optional[int] = None):
+        """Copy an upload to a temp file in fixed-size chunks, hashing as it goes.
 
-    async def _process_document_async(self, document: Document):
-        """Process document with RAG service"""
+        Returns (temp path, md5 hex digest, size). Memory use is one chunk
+        regardless of file size; the copy is aborted as soon as it exceeds
+        ``max_bytes`` (default ``max_file_size_bytes``).
+        """
+        max_bytes = max_bytes or settings.max_file_size_bytes
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        os.close(fd)
+        file_hash = hashlib.md5()
+        file_size = 0
         try:
-            success = await self.rag_service.process_document(document, self.db)
-            if not success:
-                print(f"❌ Failed to process document {document.id}")
-            else:
-                print(f"✅ Successfully processed document {document.id}")
-        except Exception as e:
-            print(f"❌ Error processing document {document.id}: {str(e)}")
-            document.processing_status = "failed"
-            self.db.commit()
+            async with aiofiles.open(temp_path, 'wb') as f:
+                while True:
+                    chunk = await file.read(settings.upload_chunk_size)
+                    if not chunk:
+                        break
+                    file_size += len(chunk)
+                    if file_size > max_bytes:
+                        raise self._file_too_large(max_bytes)
+                    file_hash.update(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return temp_path, file_hash.hexdigest(), file_size
+
+    def _file_too_large(self, max_bytes: Optional[int] = None) -> HTTPException:
+        max_mb = (max_bytes or settings.max_file_size_bytes) // (1024 * 1024)
+        return HTTPException(
+            status_code=400,
+            detail=f"File too large. Maximum size: {max_mb}MB"
+        )
+
+    def reprocess_document(self, document: Document, priority: int = 0):
+        """Queue an existing document for another processing run"""
+        return ingestion_queue.enqueue(self.db, document, priority=priority)
 
     def get_user_documents(self, user_id: int, skip: int = 0, limit: int = 100) -> List[Document]:
         """Get documents for a user with pagination"""
@@ -108,6 +349,14 @@ class DocumentService:
             .first()
         )
 
+    def get_document_by_hash(self, user_id: int, content_hash: str) -> Optional[Document]:
+        """Get a user's document with identical content, if any"""
+        return (
+            self.db.query(Document)
+            .filter(Document.user_id == user_id, Document.content_hash == content_hash)
+            .first()
+        )
+
     def delete_document(self, document_id: int, user_id: int) -> bool:
         """Delete a document and remove from vector store"""
         document = self.get_document_by_id(document_id, user_id)
@@ -148,7 +397,7 @@ class DocumentService:
                 "total_documents": total_docs,
                 "processed_documents": completed_docs,
                 "file_types": file_types,
-                "vector_stats": self.rag_service.get_collection_stats(user_id)
+                "vector_stats": get_vector_store().collection_stats(user_id)
             }
 
         except Exception as e:
@@ -0,0 +1,97 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU of query text -> embedding, stored in one float32 matrix.
+
+    Keys hash the embedding model name with the text, so switching models
+    never returns stale vectors. Capacity is derived from a memory budget;
+    evicted rows are optionally written to ``spill_dir`` as ``.npy`` files and
+    promoted back into memory on their next hit.
+    """
+
+    def __init__(self, model_name: str, dim: int, max_mb: int = 32, spill_dir: Optional[str] = None,
+                 spill_max_entries: int = 100_000):
+        self.model_name = model_name
+        self.capacity = max(1, (max_mb * 1024 * 1024) // (dim * 4))
+        self._vectors = np.zeros((self.capacity, dim), dtype=np.float32)
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.spill_dir = spill_dir
+        self.spill_max_entries = spill_max_entries
+        self._spilled = set()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._spilled = {name[:-4] for name in os.listdir(spill_dir) if name.endswith(".npy")}
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self._key(text)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is not None:
+                self._slots.move_to_end(key)
+                self.hits += 1
+                return self._vectors[slot].copy()
+            if key in self._spilled:
+                try:
+                    vector = np.load(os.path.join(self.spill_dir, f"{key}.npy"))
+                except Exception:
+                    self._spilled.discard(key)
+                else:
+                    self._insert(key, vector)
+                    self.hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vector: np.ndarray):
+        key = self._key(text)
+        with self._lock:
+            if key in self._slots:
+                self._slots.move_to_end(key)
+                return
+            self._insert(key, vector)
+
+    def _insert(self, key: str, vector: np.ndarray):
+        if not self._free:
+            old_key, old_slot = self._slots.popitem(last=False)
+            self._spill(old_key, self._vectors[old_slot])
+            self._free.append(old_slot)
+        slot = self._free.pop()
+        self._vectors[slot] = vector
+        self._slots[key] = slot
+
+    def _spill(self, key: str, vector: np.ndarray):
+        if not self.spill_dir or key in self._spilled or len(self._spilled) >= self.spill_max_entries:
+            return
+        try:
+            np.save(os.path.join(self.spill_dir, f"{key}.npy"), vector)
+            self._spilled.add(key)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to spill query embedding: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+            "spilled": len(self._spilled),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,70 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CPUExecutors:
+    """Dedicated pools for blocking ingestion work.
+
+    OCR and PDF parsing run in a process pool (they hold the GIL for long
+    stretches); embedding and index writes run in a thread pool since the
+    model releases the GIL inside torch. Each pool is fronted by a semaphore
+    so a burst of uploads queues as cheap coroutines rather than pickled jobs.
+    """
+
+    def __init__(self):
+        self._extraction_pool: Optional[ProcessPoolExecutor] = None
+        self._embedding_pool: Optional[ThreadPoolExecutor] = None
+        self._extraction_slots = asyncio.Semaphore(max(1, settings.extraction_workers))
+        self._embedding_slots = asyncio.Semaphore(max(1, settings.embedding_workers))
+
+    @property
+    def extraction_pool(self) -> ProcessPoolExecutor:
+        if self._extraction_pool is None:
+            # spawn, not fork: the parent already holds torch/Chroma threads
+            self._extraction_pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.extraction_workers),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"🧵 Started extraction process pool ({settings.extraction_workers} workers)")
+        return self._extraction_pool
+
+    @property
+    def embedding_pool(self) -> ThreadPoolExecutor:
+        if self._embedding_pool is None:
+            self._embedding_pool = ThreadPoolExecutor(
+                max_workers=max(1, settings.embedding_workers),
+                thread_name_prefix="embed"
+            )
+        return self._embedding_pool
+
+    async def run_extraction(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run a picklable module-level function in the extraction process pool"""
+        async with self._extraction_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.extraction_pool, functools.partial(fn, *args))
+
+    async def run_embedding(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run model or index work in the embedding thread pool"""
+        async with self._embedding_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.embedding_pool, functools.partial(fn, *args))
+
+    def shutdown(self):
+        if self._extraction_pool is not None:
+            self._extraction_pool.shutdown(wait=False, cancel_futures=True)
+            self._extraction_pool = None
+        if self._embedding_pool is not None:
+            self._embedding_pool.shutdown(wait=False, cancel_futures=True)
+            self._embedding_pool = None
+
+
+# Global executor layer (one per worker process)
+cpu_executors = CPUExecutors()
@@ -0,0 +1,154 @@
+"""Blocking text extractors for uploaded files.
+
+These are plain module-level functions so they can be pickled and run in the
+extraction process pool (see ``app.services.executors``).
+"""
+import logging
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import PyPDF2
+import docx
+from PIL import Image
+import pytesseract
+import cv2
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Format of the extracted text (PDF pages joined by "\f"). Cached text is keyed by it,
+# so bump it whenever extraction output changes
+EXTRACTION_VERSION = 2
+
+# Configure OCR (also runs on import inside each pool worker)
+if settings.tesseract_path:
+    pytesseract.pytesseract.tesseract_cmd = settings.tesseract_path
+
+
+def extract_text(file_path: str, file_type: str) -> str:
+    """Extract text from various file types including images"""
+    file_type = file_type.lower()
+    if file_type == 'pdf':
+        return extract_pdf_text(file_path)
+    elif file_type == 'docx':
+        return extract_docx_text(file_path)
+    elif file_type == 'txt':
+        return extract_txt_text(file_path)
+    elif file_type in ['png', 'jpg', 'jpeg']:
+        return extract_image_text(file_path)
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+
+def count_pdf_pages(file_path: str) -> int:
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def _ocr_pdf_page(file_path: str, page_number: int) -> str:
+    """Rasterize and OCR a single page, so only one page image is in memory"""
+    from pdf2image import convert_from_path
+    images = convert_from_path(
+        file_path,
+        dpi=settings.pdf_ocr_dpi,
+        first_page=page_number,
+        last_page=page_number,
+        poppler_path=settings.poppler_path
+    )
+    return pytesseract.image_to_string(images[0]) if images else ""
+
+
+def extract_pdf_page_range(file_path: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """Extract pages ``start``..``end - 1`` (0-based), falling back to OCR per page.
+
+    Returns one dict per page with its text, whether OCR was used and the
+    seconds spent on it.
+    """
+    pages = []
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for index in range(start, min(end, len(pdf_reader.pages))):
+            started = time.perf_counter()
+            ocr = False
+            try:
+                page_text = pdf_reader.pages[index].extract_text() or ""
+            except Exception as e:
+                logger.warning(f"⚠️ Text layer extraction failed on page {index + 1}: {e}")
+                page_text = ""
+            if not page_text.strip():
+                ocr = True
+                try:
+                    page_text = f"--- Page {index + 1} ---\n{_ocr_pdf_page(file_path, index + 1)}"
+                except Exception as ocr_error:
+                    logger.warning(f"⚠️ OCR fallback failed on page {index + 1}: {ocr_error}")
+                    page_text = ""
+            pages.append({
+                "page": index + 1,
+                "text": page_text,
+                "ocr": ocr,
+                "seconds": round(time.perf_counter() - started, 3)
+            })
+    return pages
+
+
+def extract_pdf_text(file_path: str) -> str:
+    try:
+        pages = extract_pdf_page_range(file_path, 0, count_pdf_pages(file_path))
+    except Exception as e:
+        logger.error(f"❌ PDF extraction failed: {e}")
+        return ""
+    return "\n".join(page["text"] for page in pages if page["text"]).strip()
+
+
+def _docx_heading_prefix(paragraph) -> str:
+    """Markdown-style marker for Title/Heading N paragraphs, so chunking can find section starts"""
+    style = paragraph.style.name if paragraph.style is not None else ""
+    if style == "Title":
+        return "# "
+    if style.startswith("Heading"):
+        level = style[len("Heading"):].strip()
+        return "#" * min(int(level), 6) + " " if level.isdigit() else "# "
+    return ""
+
+
+def extract_docx_text(file_path: str) -> str:
+    text = ""
+    try:
+        doc = docx.Document(file_path)
+        for paragraph in doc.paragraphs:
+            if paragraph.text.strip():
+                text += _docx_heading_prefix(paragraph) + paragraph.text + "\n"
+    except Exception as e:
+        logger.error(f"❌ DOCX extraction failed: {e}")
+    return text.strip()
+
+
+def extract_txt_text(file_path: str) -> str:
+    try:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return file.read()
+    except UnicodeDecodeError:
+        try:
+            with open(file_path, 'r', encoding='latin-1') as file:
+                return file.read()
+        except Exception as e:
+            logger.error(f"❌ TXT extraction failed: {e}")
+            return ""
+
+
+def extract_image_text(file_path: str) -> str:
+    try:
+        image = cv2.imread(file_path)
+        if image is None:
+            pil_image = Image.open(file_path)
+            image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        text = pytesseract.image_to_string(thresh, config='--psm 6')
+        logger.info(f"✅ OCR extracted {len(text)} characters from image")
+        return text.strip()
+    except Exception as e:
+        logger.error(f"❌ Image OCR failed: {e}")
+        return ""
@@ -1,5 +1,4 @@
-import google.generativeai as genai
-from app.core.config import settings
+from app.services.llm_client import get_llm_client
 import asyncio
 from typing import Optional
 import traceback
@@ -9,16 +8,10 @@ logger = logging.getLogger(__name__)
 
 class GeminiService:
     def __init__(self):
-        genai.configure(api_key=settings.gemini_api_key)
-        try:
-            self.gemini_model = genai.GenerativeModel("gemini-2.5-flash")
-        except Exception as e:
-            print(f"❌ Failed to initialize Gemini model: {e}")
-            traceback.print_exc()
-            self.gemini_model = None
+        self.llm_client = get_llm_client()
 
     async def generate_response(self, message: str, context: Optional[str] = None) -> str:
-        if not self.gemini_model:
+        if not self.llm_client.available:
             logger.error("Gemini model not initialized")
             return "❌ AI model not available"
         try:
@@ -29,16 +22,18 @@ class GeminiService:
 
             logger.info(f"Sending prompt to Gemini: {prompt}")
 
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, lambda: self.gemini_model.generate_content(prompt))
+            response_text = await self.llm_client.generate(prompt)
 
-            if response and response.text:
-                logger.info(f"Received response from Gemini with length {len(response.text)}")
-                return response.text
+            if response_text:
+                logger.info(f"Received response from Gemini with length {len(response_text)}")
+                return response_text
             else:
                 logger.warning("Received empty response text from Gemini API")
                 return "❌ Empty response from Gemini API"
 
+        except asyncio.TimeoutError:
+            logger.error(f"Gemini API timed out after {self.llm_client.timeout}s")
+            return "Sorry, the AI model took too long to respond. Please try again."
         except Exception as e:
             logger.error(f"Gemini API error: {e}")
             traceback.print_exc()
@@ -0,0 +1,354 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.models import Document, IngestionJob, User
+from app.services.model_loader import model_loader
+from app.services.progress import progress_tracker
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class IngestionQueue:
+    """Database-backed document ingestion queue.
+
+    Jobs live in the ``ingestion_jobs`` table, so they survive restarts and
+    can be shared by several worker processes: a job is claimed with a
+    conditional UPDATE, and ``running`` jobs whose lease has expired are put
+    back in the queue. Claiming considers each user's next job, skipping users
+    already at ``ingestion_per_user_concurrency``, and prefers higher
+    priority, then the user with the fewest running jobs, then the oldest job.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._running = False
+        self._last_sweep = 0.0
+
+    def enqueue(self, db: Session, document: Document, priority: int = 0) -> IngestionJob:
+        """Queue a document for processing, reusing an already active job"""
+        job = (
+            db.query(IngestionJob)
+            .filter(IngestionJob.document_id == document.id, IngestionJob.status.in_(ACTIVE_STATUSES))
+            .first()
+        )
+        if job:
+            if priority > (job.priority or 0):
+                job.priority = priority
+                db.commit()
+            return job
+
+        job = IngestionJob(
+            document_id=document.id,
+            user_id=document.user_id,
+            status="queued",
+            priority=priority,
+            attempts=0,
+            max_attempts=settings.ingestion_max_attempts,
+            next_run_at=datetime.utcnow(),
+            progress=0.0
+        )
+        document.processing_status = "pending"
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        # Any worker process may claim it; drop a stale final entry from an earlier run
+        progress_tracker.discard(document.id)
+        self._wakeup.set()
+        logger.info(f"📥 Queued document {document.id} (job {job.id}, priority {priority})")
+        return job
+
+    def enqueue_many(self, db: Session, documents: List[Document], priority: int = 0,
+                     batch_id: Optional[str] = None) -> List[IngestionJob]:
+        """Queue freshly registered documents in the same transaction that created them"""
+        now = datetime.utcnow()
+        jobs = []
+        for document in documents:
+            document.processing_status = "pending"
+            jobs.append(IngestionJob(
+                document_id=document.id,
+                user_id=document.user_id,
+                batch_id=batch_id,
+                status="queued",
+                priority=priority,
+                attempts=0,
+                max_attempts=settings.ingestion_max_attempts,
+                next_run_at=now,
+                progress=0.0
+            ))
+        db.add_all(jobs)
+        db.commit()
+        self._wakeup.set()
+        logger.info(f"📥 Queued {len(jobs)} documents" + (f" (batch {batch_id})" if batch_id else ""))
+        return jobs
+
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        for n in range(max(1, settings.ingestion_workers)):
+            self._tasks.append(asyncio.create_task(self._worker_loop(n)))
+        logger.info(f"🏭 Started {len(self._tasks)} ingestion workers ({self.worker_id})")
+
+    async def stop(self):
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _requeue_expired(self, db: Session):
+        """Return jobs abandoned by a crashed or restarted worker to the queue"""
+        self._last_sweep = time.monotonic()
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.ingestion_lease_seconds)
+        count = (
+            db.query(IngestionJob)
+            .filter(IngestionJob.status == "running", IngestionJob.locked_at < cutoff)
+            .update(
+                {"status": "queued", "locked_by": None, "locked_at": None},
+                synchronize_session=False
+            )
+        )
+        db.commit()
+        if count:
+            logger.info(f"♻️ Re-queued {count} expired ingestion jobs")
+
+    def _claim_next(self, db: Session) -> Optional[IngestionJob]:
+        now = datetime.utcnow()
+        limit = settings.ingestion_per_user_concurrency
+        running = dict(
+            db.query(IngestionJob.user_id, func.count(IngestionJob.id))
+            .filter(IngestionJob.status == "running")
+            .group_by(IngestionJob.user_id)
+            .all()
+        )
+        at_limit = [user_id for user_id, count in running.items() if count >= limit]
+        # Each eligible user's next job, so one user's backlog can't crowd everyone else out
+        ranked = (
+            db.query(
+                IngestionJob.id.label("id"),
+                func.row_number().over(
+                    partition_by=IngestionJob.user_id,
+                    order_by=(IngestionJob.priority.desc(), IngestionJob.id.asc())
+                ).label("position")
+            )
+            .filter(IngestionJob.status == "queued", IngestionJob.next_run_at <= now)
+            .filter(IngestionJob.user_id.notin_(at_limit))
+            .subquery()
+        )
+        candidates = (
+            db.query(IngestionJob)
+            .join(ranked, ranked.c.id == IngestionJob.id)
+            .filter(ranked.c.position == 1)
+            .order_by(IngestionJob.priority.desc(), IngestionJob.id.asc())
+            .limit(50)
+            .all()
+        )
+        candidates.sort(key=lambda job: (-(job.priority or 0), running.get(job.user_id, 0), job.id))
+        candidates = [(job.id, job.user_id) for job in candidates]
+        # End the read transaction so the re-count below sees other workers' claims
+        db.rollback()
+
+        for job_id, user_id in candidates:
+            # Lock the user's row so workers claiming for the same user take turns,
+            # then re-count: another worker may have claimed since the counts above
+            db.query(User.id).filter(User.id == user_id).with_for_update().first()
+            if self._running_count(db, user_id) >= limit:
+                db.rollback()
+                continue
+            claimed = (
+                db.query(IngestionJob)
+                .filter(IngestionJob.id == job_id, IngestionJob.status == "queued")
+                .update(
+                    {
+                        "status": "running",
+                        "locked_by": self.worker_id,
+                        "locked_at": now,
+                        "attempts": IngestionJob.attempts + 1,
+                    },
+                    synchronize_session=False
+                )
+            )
+            db.commit()
+            if claimed:
+                return db.get(IngestionJob, job_id)
+        return None
+
+    @staticmethod
+    def _running_count(db: Session, user_id: int) -> int:
+        return (
+            db.query(func.count(IngestionJob.id))
+            .filter(IngestionJob.user_id == user_id, IngestionJob.status == "running")
+            .scalar()
+        )
+
+    async def _worker_loop(self, n: int):
+        while self._running:
+            db = SessionLocal()
+            try:
+                if time.monotonic() - self._last_sweep >= settings.ingestion_sweep_interval_seconds:
+                    self._requeue_expired(db)
+                job = self._claim_next(db)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(
+                            self._wakeup.wait(), timeout=settings.ingestion_poll_interval_seconds
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run_job(db, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ingestion worker {n} error: {e}", exc_info=True)
+                await asyncio.sleep(settings.ingestion_poll_interval_seconds)
+            finally:
+                db.close()
+
+    async def _run_job(self, db: Session, job: IngestionJob):
+        document = db.query(Document).filter(Document.id == job.document_id).first()
+        if document is None:
+            job.status = "failed"
+            job.last_error = "Document no longer exists"
+            db.commit()
+            return
+
+        logger.info(f"⚙️ Job {job.id}: processing document {document.id} (attempt {job.attempts})")
+        error = None
+        try:
+            rag_service = await model_loader.load_model()
+            success = await rag_service.process_document(document, db, self._heartbeat(job.id))
+        except Exception as e:
+            db.rollback()
+            success = False
+            error = str(e)
+
+        if success:
+            job.status = "completed"
+            job.progress = 1.0
+            job.last_error = None
+            progress_tracker.finish(document.id, "completed")
+        elif job.attempts < job.max_attempts:
+            delay = settings.ingestion_retry_backoff_seconds * (2 ** (job.attempts - 1))
+            job.status = "queued"
+            job.progress = 0.0
+            job.next_run_at = datetime.utcnow() + timedelta(seconds=delay)
+            job.last_error = error or "Processing failed"
+            document.processing_status = "pending"
+            progress_tracker.discard(document.id)
+            logger.warning(f"⚠️ Job {job.id} failed, retrying in {delay}s")
+        else:
+            job.status = "failed"
+            job.last_error = error or "Processing failed"
+            document.processing_status = "failed"
+            progress_tracker.finish(document.id, "failed", job.last_error)
+            logger.error(f"❌ Job {job.id} failed after {job.attempts} attempts")
+        job.locked_by = None
+        job.locked_at = None
+        db.commit()
+
+    def _heartbeat(self, job_id: int):
+        """Progress callback that renews the job's lease and stores its progress, throttled"""
+        last_beat = time.monotonic()
+
+        def beat(percent: float):
+            nonlocal last_beat
+            now = time.monotonic()
+            if now - last_beat < settings.ingestion_heartbeat_seconds:
+                return
+            last_beat = now
+            # Own session: the job's session holds the document's uncommitted chunk rows
+            with SessionLocal() as beat_db:
+                renewed = (
+                    beat_db.query(IngestionJob)
+                    .filter(IngestionJob.id == job_id, IngestionJob.locked_by == self.worker_id)
+                    .update(
+                        {"locked_at": datetime.utcnow(), "progress": round(percent / 100.0, 3)},
+                        synchronize_session=False
+                    )
+                )
+                beat_db.commit()
+            if not renewed:
+                logger.warning(f"⚠️ Job {job_id} lost its lease while running")
+
+        return beat
+
+    def get_queue_stats(self, db: Session, user_id: Optional[int] = None) -> Dict[str, Any]:
+        query = db.query(IngestionJob.status, func.count(IngestionJob.id))
+        if user_id is not None:
+            query = query.filter(IngestionJob.user_id == user_id)
+        counts = dict(query.group_by(IngestionJob.status).all())
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "completed": counts.get("completed", 0),
+            "failed": counts.get("failed", 0),
+            "workers": len(self._tasks),
+            "worker_id": self.worker_id,
+        }
+
+    def get_user_jobs(self, db: Session, user_id: int, limit: int = 50) -> List[IngestionJob]:
+        return (
+            db.query(IngestionJob)
+            .filter(IngestionJob.user_id == user_id)
+            .order_by(IngestionJob.id.desc())
+            .limit(limit)
+            .all()
+        )
+
+    def get_batch_progress(self, db: Session, user_id: int, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Aggregate progress of a bulk upload; live entries for documents this process is running"""
+        jobs = (
+            db.query(IngestionJob)
+            .filter(IngestionJob.batch_id == batch_id, IngestionJob.user_id == user_id)
+            .all()
+        )
+        if not jobs:
+            return None
+        statuses: Dict[str, int] = {}
+        documents = []
+        for job in jobs:
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+            entry = progress_tracker.get(job.document_id)
+            if entry is None:
+                entry = {
+                    "document_id": job.document_id,
+                    "stage": job.status,
+                    "percent": round(100.0 * (job.progress or 0.0), 1),
+                    "error": job.last_error
+                }
+            documents.append(entry)
+        return {
+            "batch_id": batch_id,
+            "total": len(jobs),
+            "statuses": statuses,
+            "percent": round(sum(doc["percent"] for doc in documents) / len(documents), 1),
+            "documents": documents,
+        }
+
+    def get_document_job(self, db: Session, document_id: int) -> Optional[IngestionJob]:
+        return (
+            db.query(IngestionJob)
+            .filter(IngestionJob.document_id == document_id)
+            .order_by(IngestionJob.id.desc())
+            .first()
+        )
+
+
+# Global ingestion queue (one set of workers per process)
+ingestion_queue = IngestionQueue()
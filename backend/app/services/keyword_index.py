@@ -0,0 +1,262 @@
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Identifiers such as "ABC-123", "v2.1.0" or "user_id" stay whole; their parts are indexed too
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+(?:[-_./][A-Za-z0-9]+)*")
+PART_PATTERN = re.compile(r"[A-Za-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i in is it its of on or that the this to was what "
+    "when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if token not in STOPWORDS:
+            tokens.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part not in STOPWORDS)
+    return tokens
+
+
+class _UserIndex:
+    """In-memory inverted index for one user's chunks"""
+
+    def __init__(self, version: int = 0):
+        # keyword_users.version this index reflects
+        self.version = version
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def add(self, chunk_id: str, text: str):
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+        length = sum(counts.values())
+        self.lengths[chunk_id] = length
+        self.total_length += length
+
+    def remove(self, chunk_id: str, text: str):
+        length = self.lengths.pop(chunk_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def search(self, terms: Sequence[str], n: int, k1: float, b: float) -> List[Tuple[str, float]]:
+        count = len(self.lengths)
+        if not count:
+            return []
+        avg_length = self.total_length / count or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                norm = tf + k1 * (1 - b + b * self.lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+class KeywordIndex:
+    """Per-user BM25 keyword search, kept in step with the vector collections.
+
+    Chunk text and metadata are persisted in a local SQLite file; a user's
+    inverted index is built in memory on first use and then updated
+    incrementally as chunks are added or deleted. Every write bumps the
+    user's version in ``keyword_users``; a loaded index whose version no
+    longer matches (another worker process wrote in between) is rebuilt
+    before it is searched. At most ``max_users`` indexes stay loaded (least
+    recently used are dropped and rebuilt on demand).
+    """
+
+    def __init__(self, path: str, max_users: int = 256, k1: float = 1.2, b: float = 0.75):
+        self.max_users = max_users
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._loaded: "OrderedDict[int, _UserIndex]" = OrderedDict()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS keyword_chunks ("
+            "user_id INTEGER NOT NULL, chunk_id TEXT NOT NULL, document_id INTEGER, text TEXT NOT NULL, "
+            "metadata TEXT, PRIMARY KEY (user_id, chunk_id))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_keyword_chunks_document ON keyword_chunks (user_id, document_id)"
+        )
+        # Per-user write counter, and whether chunks stored before hybrid search were backfilled
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS keyword_users ("
+            "user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0, "
+            "backfilled INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.commit()
+
+    def _version(self, user_id: int) -> int:
+        row = self._conn.execute("SELECT version FROM keyword_users WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _bump_version(self, user_id: int) -> int:
+        """Count a write; call inside the write transaction"""
+        self._conn.execute("INSERT OR IGNORE INTO keyword_users (user_id) VALUES (?)", (user_id,))
+        self._conn.execute("UPDATE keyword_users SET version = version + 1 WHERE user_id = ?", (user_id,))
+        return self._version(user_id)
+
+    def _current_index(self, user_id: int, version: int) -> Optional[_UserIndex]:
+        """The loaded index if it was one write behind ``version``, else None (and dropped)"""
+        index = self._loaded.get(user_id)
+        if index is not None and index.version != version - 1:
+            del self._loaded[user_id]
+            return None
+        return index
+
+    def _user_index(self, user_id: int) -> _UserIndex:
+        version = self._version(user_id)
+        index = self._loaded.get(user_id)
+        if index is not None and index.version == version:
+            self._loaded.move_to_end(user_id)
+            return index
+        index = _UserIndex(version)
+        for chunk_id, text in self._conn.execute(
+            "SELECT chunk_id, text FROM keyword_chunks WHERE user_id = ?", (user_id,)
+        ):
+            index.add(chunk_id, text)
+        self._loaded[user_id] = index
+        logger.info(f"🔤 Loaded keyword index for user {user_id}: {len(index.lengths)} chunks, {len(index.postings)} terms")
+        while len(self._loaded) > self.max_users:
+            self._loaded.popitem(last=False)
+        return index
+
+    def is_backfilled(self, user_id: int) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT backfilled FROM keyword_users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            return bool(row and row[0])
+
+    def mark_backfilled(self, user_id: int):
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO keyword_users (user_id) VALUES (?)", (user_id,))
+            self._conn.execute("UPDATE keyword_users SET backfilled = 1 WHERE user_id = ?", (user_id,))
+            self._conn.commit()
+
+    @contextmanager
+    def _transaction(self, user_id: int):
+        """Write transaction holding SQLite's write lock from the start, so reads inside it are consistent"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            self._conn.commit()
+        except BaseException:
+            self._conn.rollback()
+            # The in-memory index may be half updated; rebuild it on next use
+            self._loaded.pop(user_id, None)
+            raise
+
+    def add(self, user_id: int, chunk_ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
+        with self._lock, self._transaction(user_id):
+            index = self._current_index(user_id, self._bump_version(user_id))
+            if index is not None:
+                # Re-added ids (reprocessing) must drop the postings of their previous text first
+                replaced = [chunk_id for chunk_id in chunk_ids if chunk_id in index.lengths]
+                for start in range(0, len(replaced), 500):
+                    batch = replaced[start:start + 500]
+                    for chunk_id, old_text in self._conn.execute(
+                        f"SELECT chunk_id, text FROM keyword_chunks WHERE user_id = ? "
+                        f"AND chunk_id IN ({','.join('?' * len(batch))})",
+                        [user_id, *batch]
+                    ).fetchall():
+                        index.remove(chunk_id, old_text)
+                for chunk_id, text in zip(chunk_ids, texts):
+                    index.add(chunk_id, text)
+                index.version += 1
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO keyword_chunks (user_id, chunk_id, document_id, text, metadata) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (user_id, chunk_id, (metadata or {}).get("document_id"), text, json.dumps(metadata or {}))
+                    for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas)
+                ]
+            )
+
+    def delete_document(self, user_id: int, document_id: int) -> int:
+        with self._lock, self._transaction(user_id):
+            rows = self._conn.execute(
+                "SELECT chunk_id, text FROM keyword_chunks WHERE user_id = ? AND document_id = ?",
+                (user_id, document_id)
+            ).fetchall()
+            if not rows:
+                return 0
+            index = self._current_index(user_id, self._bump_version(user_id))
+            if index is not None:
+                for chunk_id, text in rows:
+                    index.remove(chunk_id, text)
+                index.version += 1
+            self._conn.execute(
+                "DELETE FROM keyword_chunks WHERE user_id = ? AND document_id = ?", (user_id, document_id)
+            )
+            return len(rows)
+
+    def search(self, user_id: int, query: str, n: int = 20) -> List[Dict[str, Any]]:
+        """Top ``n`` chunks by BM25 as dicts shaped like vector results (plus ``keyword_score``)"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            hits = self._user_index(user_id).search(terms, n, self.k1, self.b)
+            if not hits:
+                return []
+            placeholders = ",".join("?" * len(hits))
+            rows = {
+                chunk_id: (text, metadata) for chunk_id, text, metadata in self._conn.execute(
+                    f"SELECT chunk_id, text, metadata FROM keyword_chunks WHERE user_id = ? "
+                    f"AND chunk_id IN ({placeholders})",
+                    [user_id, *(chunk_id for chunk_id, _ in hits)]
+                )
+            }
+        return [
+            {
+                "id": chunk_id,
+                "text": rows[chunk_id][0],
+                "metadata": json.loads(rows[chunk_id][1] or "{}"),
+                "keyword_score": round(score, 4),
+                "rank": rank + 1
+            }
+            for rank, (chunk_id, score) in enumerate(hits) if chunk_id in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._loaded.clear()
+            self._conn.close()
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
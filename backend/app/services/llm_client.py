@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend:
+    """Blocking text-generation backend; LLMClient runs it off the event loop."""
+
+    name = "base"
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        yield self.generate(prompt)
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self):
+        import google.generativeai as genai
+
+        genai.configure(api_key=settings.gemini_api_key)
+        self.model = genai.GenerativeModel("gemini-2.5-flash")
+
+    def generate(self, prompt: str) -> str:
+        return self.model.generate_content(prompt).text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend(LLMBackend):
+    """Offline backend for load tests: echoes the prompt tail after a fixed delay."""
+
+    name = "fake"
+
+    def __init__(self, latency_ms: int = 50, tokens: int = 20):
+        self.latency = latency_ms / 1000.0
+        self.tokens = tokens
+
+    def _words(self, prompt: str):
+        words = prompt.split()[-self.tokens:] or ["(empty)"]
+        return ["Fake", "answer:"] + words
+
+    def generate(self, prompt: str) -> str:
+        time.sleep(self.latency)
+        return " ".join(self._words(prompt))
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        words = self._words(prompt)
+        for i, word in enumerate(words):
+            time.sleep(self.latency / len(words))
+            yield word if i == 0 else " " + word
+
+
+class LLMClient:
+    """Async facade over an LLMBackend with bounded concurrency and timeouts.
+
+    Calls run on a dedicated thread pool of ``max_concurrency`` workers. If the
+    awaiting coroutine is cancelled (e.g. the HTTP client went away) a
+    streaming call stops pulling from the backend at the next chunk.
+    """
+
+    def __init__(self, backend: Optional[LLMBackend], max_concurrency: int = 8, timeout_seconds: float = 60.0):
+        self.backend = backend
+        self.timeout = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="llm")
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+
+    @property
+    def available(self) -> bool:
+        return self.backend is not None
+
+    async def generate(self, prompt: str) -> str:
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._executor, self.backend.generate, prompt),
+                timeout=self.timeout
+            )
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield text chunks; ``timeout`` bounds the wait for each chunk"""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue()
+            cancelled = threading.Event()
+            done = object()
+
+            def produce():
+                try:
+                    for text in self.backend.stream(prompt):
+                        if cancelled.is_set():
+                            break
+                        loop.call_soon_threadsafe(queue.put_nowait, text)
+                    loop.call_soon_threadsafe(queue.put_nowait, done)
+                except Exception as e:
+                    loop.call_soon_threadsafe(queue.put_nowait, e)
+
+            loop.run_in_executor(self._executor, produce)
+            try:
+                while True:
+                    item = await asyncio.wait_for(queue.get(), timeout=self.timeout)
+                    if item is done:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                cancelled.set()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_llm_backend() -> Optional[LLMBackend]:
+    if settings.llm_backend == "fake":
+        return FakeBackend(latency_ms=settings.llm_fake_latency_ms)
+    if not settings.gemini_api_key:
+        logger.warning("⚠️ No Gemini API key provided")
+        return None
+    try:
+        backend = GeminiBackend()
+        logger.info(f"✅ Gemini API initialized with model {settings.gemini_model_name}")
+        return backend
+    except Exception as e:
+        logger.error(f"❌ Failed to initialize Gemini model: {e}")
+        return None
+
+
+_llm_client: Optional[LLMClient] = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Process-wide LLM client shared by RAGService and GeminiService"""
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = LLMClient(
+                create_llm_backend(),
+                max_concurrency=settings.llm_max_concurrency,
+                timeout_seconds=settings.llm_timeout_seconds
+            )
+        return _llm_client
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.services.rag_service import RAGService
+from app.services.vector_store import close_vector_store
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLoader:
+    """Owns the process-wide RAGService (embedding model, splitter, Chroma client).
+
+    The service is built once per worker, normally from the FastAPI lifespan
+    hook, and handed to request handlers through ``get_rag_service``.
+    """
+
+    def __init__(self):
+        self.rag_service: Optional[RAGService] = None
+        self.loading = False
+        self.loaded = False
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def load_model(self) -> RAGService:
+        if self.loaded:
+            return self.rag_service
+        async with self._lock:
+            if self.loaded:
+                return self.rag_service
+            self.loading = True
+            self.error = None
+            try:
+                logger.info(f"🤖 Loading AI model: {settings.embedding_model}")
+                loop = asyncio.get_running_loop()
+
+                started = time.perf_counter()
+                rag_service = await loop.run_in_executor(None, RAGService)
+                self.load_seconds = time.perf_counter() - started
+
+                # Run one encode so the first real request doesn't pay for lazy init
+                started = time.perf_counter()
+                await loop.run_in_executor(None, rag_service.warm_up)
+                self.warmup_seconds = time.perf_counter() - started
+
+                self.rag_service = rag_service
+                self.loaded = True
+                logger.info(
+                    f"✅ AI model loaded in {self.load_seconds:.2f}s "
+                    f"(warm-up {self.warmup_seconds:.2f}s)"
+                )
+                return self.rag_service
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"❌ Failed to load model: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"Model loading failed: {str(e)}"
+                )
+            finally:
+                self.loading = False
+
+    def shutdown(self):
+        """Drop the shared service so its resources can be released."""
+        if self.rag_service:
+            self.rag_service.query_executor.shutdown(wait=False)
+            if self.rag_service.content_cache is not None:
+                self.rag_service.content_cache.close()
+            if self.rag_service.keyword_index is not None:
+                self.rag_service.keyword_index.close()
+            if self.rag_service.reranker is not None:
+                self.rag_service.reranker.close()
+            close_vector_store()
+        self.rag_service = None
+        self.loaded = False
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "loading": self.loading,
+            "status": "loaded" if self.loaded else "loading" if self.loading else "not_loaded",
+            "embedding_model": settings.embedding_model,
+            "rerank_model": settings.rerank_model if self.rag_service and self.rag_service.reranker else None,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "error": self.error,
+            "query_batching": self.rag_service.query_batcher.get_stats() if self.rag_service else None,
+            "query_embedding_cache": self.rag_service.query_embedding_cache.get_stats() if self.rag_service else None,
+            "response_cache": self.rag_service.response_cache.get_stats() if self.rag_service else None,
+            "collection_cache": self.rag_service.vector_store.get_cache_stats() if self.rag_service else None,
+        }
+
+
+# Global model loader instance (one per worker process)
+model_loader = ModelLoader()
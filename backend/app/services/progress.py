@@ -0,0 +1,113 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+FINAL_STAGES = ("completed", "failed")
+# How often expired entries are swept, in seconds
+PURGE_INTERVAL_SECONDS = 30.0
+
+
+class ProgressTracker:
+    """In-memory progress of documents being ingested by *this* process.
+
+    With several worker processes, a job may be claimed by any of them, so
+    entries are only created once this process starts processing a document
+    (``claim``); queued documents and documents handled elsewhere have no
+    entry and callers fall back to the status stored in the database.
+    Final entries are kept for ``progress_retention_seconds``; entries left
+    unfinished (e.g. a cancelled job) expire after the ingestion lease.
+    ``wait_for_update`` lets SSE handlers sleep until the next change.
+    """
+
+    def __init__(self):
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._events: Dict[int, asyncio.Event] = {}
+        self._last_purge = 0.0
+
+    def claim(self, document_id: int, user_id: int, stage: str = "processing"):
+        """Start tracking a document this process is about to process"""
+        self._purge()
+        self._entries[document_id] = {
+            "document_id": document_id,
+            "user_id": user_id,
+            "stage": stage,
+            "percent": 0.0,
+            "pages_total": None,
+            "pages_extracted": 0,
+            "chunks_embedded": 0,
+            "vectors_written": 0,
+            "updated_at": time.time(),
+        }
+        self._notify(document_id)
+
+    def discard(self, document_id: int):
+        """Forget a document, e.g. when it goes back to the shared queue"""
+        if self._entries.pop(document_id, None) is not None:
+            self._notify(document_id)
+
+    def update(self, document_id: int, **fields: Any):
+        entry = self._entries.get(document_id)
+        if entry is None:
+            return
+        if "percent" in fields:
+            # Never move backwards; estimates improve as the document streams in
+            fields["percent"] = round(max(entry["percent"], min(100.0, float(fields["percent"]))), 1)
+        entry.update(fields)
+        entry["updated_at"] = time.time()
+        self._notify(document_id)
+
+    def finish(self, document_id: int, stage: str, error: Optional[str] = None):
+        entry = self._entries.get(document_id)
+        if entry is None:
+            return
+        entry["stage"] = stage
+        if stage == "completed":
+            entry["percent"] = 100.0
+        if error:
+            entry["error"] = error
+        entry["updated_at"] = time.time()
+        self._notify(document_id)
+
+    def get(self, document_id: int) -> Optional[Dict[str, Any]]:
+        self._purge()
+        entry = self._entries.get(document_id)
+        if entry is None or self._expired(entry, time.time()):
+            return None
+        return dict(entry)
+
+    async def wait_for_update(self, document_id: int, timeout: float) -> Optional[Dict[str, Any]]:
+        event = self._events.setdefault(document_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.get(document_id)
+
+    @staticmethod
+    def _expired(entry: Dict[str, Any], now: float) -> bool:
+        age = now - entry["updated_at"]
+        if entry["stage"] in FINAL_STAGES:
+            return age > settings.progress_retention_seconds
+        return age > settings.ingestion_lease_seconds
+
+    def _purge(self):
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        for document_id in [key for key, entry in self._entries.items() if self._expired(entry, now)]:
+            del self._entries[document_id]
+        # Events nobody set; a waiting SSE handler keeps its own reference until it times out
+        for document_id in [key for key in self._events if key not in self._entries]:
+            del self._events[document_id]
+
+    def _notify(self, document_id: int):
+        event = self._events.pop(document_id, None)
+        if event is not None:
+            event.set()
+
+
+# Global progress store (one per worker process)
+progress_tracker = ProgressTracker()
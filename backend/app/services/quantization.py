@@ -0,0 +1,134 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+
+def pq_subquantizer_count(dim: int, m: int) -> int:
+    """Largest sub-quantizer count <= m that divides the dimension"""
+    m = max(1, min(m, dim))
+    while dim % m:
+        m -= 1
+    return m
+
+
+class Int8Quantizer:
+    """Symmetric int8 scalar quantization with one float32 scale per vector.
+
+    A 384-d embedding shrinks from 1536 to 388 bytes. Scores computed on the
+    codes are approximate, so callers re-score their top candidates with the
+    full-precision vectors.
+    """
+
+    kind = "int8"
+    trained = True
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.dtype = np.dtype([("scale", "<f4"), ("codes", "i1", (dim,))])
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        records = np.empty(len(vectors), dtype=self.dtype)
+        records["scale"] = scales
+        records["codes"] = np.clip(np.rint(vectors / scales[:, None]), -127, 127)
+        return records
+
+    def scores(self, records: np.ndarray, query: np.ndarray) -> np.ndarray:
+        return (records["codes"].astype(np.float32) @ query) * records["scale"]
+
+    def train(self, sample: np.ndarray):
+        pass
+
+    def save(self, path: str):
+        pass
+
+    def load(self, path: str) -> bool:
+        return True
+
+
+class ProductQuantizer:
+    """Product quantization: ``m`` sub-vectors, each coded as one of 256 centroids.
+
+    Codebooks are learned with a few rounds of k-means on a sample of the
+    collection, so a collection is only quantized once it has enough vectors
+    (``trained`` is False until then). Scoring uses per-query lookup tables
+    (asymmetric distance), and a 384-d vector with m=16 takes 16 bytes.
+    """
+
+    kind = "pq"
+
+    def __init__(self, dim: int, m: int = 16, iterations: int = 15, seed: int = 0):
+        m = pq_subquantizer_count(dim, m)
+        self.dim = dim
+        self.m = m
+        self.dsub = dim // m
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None
+        self.dtype = np.dtype([("codes", "u1", (m,))])
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    def train(self, sample: np.ndarray):
+        rng = np.random.default_rng(self.seed)
+        sample = np.asarray(sample, dtype=np.float32)
+        if len(sample) < 256:
+            raise ValueError("Product quantization needs at least 256 training vectors")
+        # 64 points per centroid is plenty for k-means and keeps training to seconds
+        if len(sample) > 256 * 64:
+            sample = sample[rng.choice(len(sample), 256 * 64, replace=False)]
+        codebooks = np.empty((self.m, 256, self.dsub), dtype=np.float32)
+        for j in range(self.m):
+            data = sample[:, j * self.dsub:(j + 1) * self.dsub]
+            centroids = data[rng.choice(len(data), 256, replace=False)].copy()
+            for _ in range(self.iterations):
+                assign = self._nearest(data, centroids)
+                counts = np.bincount(assign, minlength=256)
+                sums = np.stack([np.bincount(assign, weights=data[:, d], minlength=256) for d in range(self.dsub)], axis=1)
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+            codebooks[j] = centroids
+        self.codebooks = codebooks
+
+    @staticmethod
+    def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        distances = (centroids ** 2).sum(axis=1)[None, :] - 2.0 * data @ centroids.T
+        return distances.argmin(axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        records = np.empty(len(vectors), dtype=self.dtype)
+        for j in range(self.m):
+            records["codes"][:, j] = self._nearest(vectors[:, j * self.dsub:(j + 1) * self.dsub], self.codebooks[j])
+        return records
+
+    def scores(self, records: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # lut[j, c] = <query sub-vector j, centroid c of codebook j>
+        lut = np.einsum("jcd,jd->jc", self.codebooks, query.reshape(self.m, self.dsub))
+        return lut[np.arange(self.m), records["codes"]].sum(axis=1)
+
+    def save(self, path: str):
+        np.save(path, self.codebooks)
+
+    def load(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        self.codebooks = np.load(path)
+        return True
+
+
+def create_quantizer(kind: str, dim: int, pq_subquantizers: int = 16):
+    """Quantizer for ``vector_quantization``; None means full precision"""
+    kind = (kind or "none").lower()
+    if kind == "none":
+        return None
+    if kind == "int8":
+        return Int8Quantizer(dim)
+    if kind == "pq":
+        return ProductQuantizer(dim, m=pq_subquantizers)
+    raise ValueError(f"Unknown vector_quantization: {kind}")
@@ -1,25 +1,32 @@
 import os
 import json
+import time
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Tuple
 import numpy as np
 from datetime import datetime
 
 # RAG and LLM imports
-import chromadb
-from chromadb.config import Settings as ChromaSettings
 from sentence_transformers import SentenceTransformer
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-import google.generativeai as genai
-
-# Document processing imports
-import PyPDF2
-import docx
-from PIL import Image
-import pytesseract
-import cv2
 
 from app.core.config import settings
+from app.services import extractors
+from app.services.embedding_batcher import QueryEmbeddingBatcher
+from app.services.chunking import PAGE_BREAK, IncrementalSplitter, splitter_for_file_type
+from app.services.context_builder import build_context
+from app.services.content_cache import ContentCache, file_md5
+from app.services.conversation_memory import ConversationHistory
+from app.services.embedding_cache import QueryEmbeddingCache
+from app.services.executors import cpu_executors
+from app.services.keyword_index import KeywordIndex, reciprocal_rank_fusion
+from app.services.llm_client import get_llm_client
+from app.services.progress import progress_tracker
+from app.services.reranker import CrossEncoderReranker
+from app.services.response_cache import SemanticResponseCache
+from app.services.tokens import count_tokens
+from app.services.vector_store import get_vector_store
 from app.models.models import Document, DocumentChunk
 from sqlalchemy.orm import Session
 
@@ -29,20 +36,8 @@ logger = logging.getLogger(__name__)
 
 class RAGService:
     def __init__(self):
-        # Initialize Gemini API
-        if settings.gemini_api_key:
-            genai.configure(api_key=settings.gemini_api_key)
-            try:
-                #self.gemini_model = genai.GenerativeModel(settings.gemini_model_name)
-                self.gemini_model = genai.GenerativeModel("gemini-2.5-flash")
-
-                logger.info(f"✅ Gemini API initialized with model {settings.gemini_model_name}")
-            except Exception as e:
-                logger.error(f"❌ Failed to initialize Gemini model: {e}")
-                self.gemini_model = None
-        else:
-            self.gemini_model = None
-            logger.warning("⚠️ No Gemini API key provided")
+        # Shared async LLM client (Gemini, or the fake backend for load tests)
+        self.llm_client = get_llm_client()
 
         # Initialize embedding model
         try:
@@ -52,156 +47,371 @@ class RAGService:
             logger.error(f"❌ Failed to load embedding model: {e}")
             raise
 
-        # Initialize text splitter for chunking
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
+        # Repeated questions and frontend retries skip the model entirely
+        self.query_embedding_cache = QueryEmbeddingCache(
+            settings.embedding_model,
+            self.embedding_model.get_sentence_embedding_dimension(),
+            max_mb=settings.query_embedding_cache_max_mb,
+            spill_dir=os.path.join(settings.vector_store_path, "query_embedding_cache")
+            if settings.query_embedding_cache_spill else None
         )
 
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=settings.vector_store_path,
-            settings=ChromaSettings(anonymized_telemetry=False)
+        # Concurrent chat queries are encoded together off the event loop
+        self.query_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-embed")
+        self.query_batcher = QueryEmbeddingBatcher(
+            self.encode_queries,
+            max_batch_size=settings.query_batch_max_size,
+            max_wait_ms=settings.query_batch_wait_ms,
+            executor=self.query_executor
         )
 
-        # Configure OCR
-        if settings.tesseract_path:
-            pytesseract.pytesseract.tesseract_cmd = settings.tesseract_path
+        # Answers for near-identical questions over an unchanged document set
+        self.response_cache = SemanticResponseCache(
+            max_entries=settings.response_cache_max_entries,
+            ttl_seconds=settings.response_cache_ttl_seconds,
+            similarity_threshold=settings.response_cache_similarity_threshold
+        )
 
-    def get_user_collection(self, user_id: int):
-        """Get or create ChromaDB collection for user"""
-        collection_name = f"user_{user_id}_documents"
-        try:
-            collection = self.chroma_client.get_collection(collection_name)
-        except:
-            collection = self.chroma_client.create_collection(
-                name=collection_name,
-                metadata={"user_id": user_id}
-            )
-            logger.info(f"✅ Created new collection: {collection_name}")
-        return collection
+        # Extracted text and chunk vectors keyed by content, reused on reprocess/re-upload
+        self.content_cache = ContentCache(
+            os.path.join(settings.vector_store_path, "content_cache.sqlite3"),
+            settings.embedding_model,
+            max_embeddings=settings.content_cache_max_embeddings,
+            text_version=extractors.EXTRACTION_VERSION
+        ) if settings.content_cache_enabled else None
+
+        # BM25 keyword index alongside the vectors, for exact identifiers and names
+        self.keyword_index = KeywordIndex(
+            os.path.join(settings.vector_store_path, "keyword_index.sqlite3"),
+            max_users=settings.keyword_index_max_users,
+            k1=settings.bm25_k1,
+            b=settings.bm25_b
+        ) if settings.hybrid_search_enabled else None
+
+        # Optional cross-encoder that re-ranks over-fetched candidates before prompting
+        self.reranker = None
+        if settings.rerank_enabled:
+            try:
+                self.reranker = CrossEncoderReranker(settings.rerank_model, batch_size=settings.rerank_batch_size)
+                logger.info(f"✅ Re-ranking model loaded: {settings.rerank_model}")
+            except Exception as e:
+                logger.warning(f"⚠️ Re-ranking disabled, failed to load {settings.rerank_model}: {e}")
+
+        # Vector store backend (ChromaDB, FAISS or NumPy) chosen by settings.vector_db_type
+        self.vector_store = get_vector_store()
+
+    def warm_up(self):
+        """Run a throwaway encode so lazy model initialisation happens at startup"""
+        self.embedding_model.encode("warm up")
+        if self.reranker is not None:
+            self.reranker.warm_up()
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in batches of ``embedding_batch_size`` into a normalized float32 matrix"""
+        batch_size = max(1, settings.embedding_batch_size)
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            batches.append(self.embedding_model.encode(
+                texts[start:start + batch_size],
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            ))
+        if not batches:
+            return np.empty((0, self.embedding_model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.vstack(batches).astype(np.float32, copy=False)
+
+    def embed_chunks(self, chunks: List[str]):
+        """Embed chunks, reusing content-addressed cached vectors; returns (matrix, cached count)"""
+        if self.content_cache is None:
+            return self.embed_texts(chunks), 0
+        cached = self.content_cache.get_embeddings(chunks)
+        missing = [i for i in range(len(chunks)) if i not in cached]
+        fresh = self.embed_texts([chunks[i] for i in missing])
+        if missing:
+            self.content_cache.put_embeddings([chunks[i] for i in missing], fresh)
+        embeddings = np.empty((len(chunks), fresh.shape[1]), dtype=np.float32)
+        for i, vector in cached.items():
+            embeddings[i] = vector
+        if missing:
+            embeddings[missing] = fresh
+        return embeddings, len(cached)
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Encode a batch of queries in one forward pass"""
+        return self.embedding_model.encode(
+            queries,
+            batch_size=len(queries),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+
+    async def encode_query(self, query: str) -> np.ndarray:
+        """Encode a single query, via the LRU cache then the cross-request micro-batcher"""
+        query_embedding = self.query_embedding_cache.get(query)
+        if query_embedding is None:
+            query_embedding = await self.query_batcher.encode(query)
+            self.query_embedding_cache.put(query, query_embedding)
+        return query_embedding
+
+    def get_user_collection(self, user_id: int, create: bool = False):
+        """Cached vector collection handle for user; None if the user has none and ``create`` is False"""
+        return self.vector_store.get_collection(user_id, create=create)
 
     async def extract_text_from_file(self, file_path: str, file_type: str) -> str:
-        """Extract text from various file types including images"""
+        """Extract text from various file types including images (runs in the extraction process pool)"""
         try:
-            if file_type.lower() == 'pdf':
-                return await self._extract_pdf_text(file_path)
-            elif file_type.lower() == 'docx':
-                return await self._extract_docx_text(file_path)
-            elif file_type.lower() == 'txt':
-                return await self._extract_txt_text(file_path)
-            elif file_type.lower() in ['png', 'jpg', 'jpeg']:
-                return await self._extract_image_text(file_path)
-            else:
-                raise ValueError(f"Unsupported file type: {file_type}")
+            return await cpu_executors.run_extraction(extractors.extract_text, file_path, file_type)
         except Exception as e:
             logger.error(f"❌ Text extraction failed for {file_path}: {e}")
             return ""
 
-    async def _extract_pdf_text(self, file_path: str) -> str:
-        text = ""
-        try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            if not text.strip():
-                try:
-                    from pdf2image import convert_from_path
-                    images = convert_from_path(file_path, poppler_path=settings.poppler_path)
-                    for i, image in enumerate(images):
-                        ocr_text = pytesseract.image_to_string(image)
-                        text += f"\n--- Page {i+1} ---\n{ocr_text}"
-                except Exception as ocr_error:
-                    logger.warning(f"⚠️ OCR fallback failed: {ocr_error}")
-        except Exception as e:
-            logger.error(f"❌ PDF extraction failed: {e}")
-        return text.strip()
+    async def _document_file_hash(self, document: Document) -> str:
+        if document.content_hash:
+            return document.content_hash
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, file_md5, document.file_path)
 
-    async def _extract_docx_text(self, file_path: str) -> str:
-        text = ""
-        try:
-            doc = docx.Document(file_path)
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    text += paragraph.text + "\n"
-        except Exception as e:
-            logger.error(f"❌ DOCX extraction failed: {e}")
-        return text.strip()
+    async def iter_document_segments(self, document: Document) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """Yield (text, page info) pieces of a document in reading order.
 
-    async def _extract_txt_text(self, file_path: str) -> str:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
-        except UnicodeDecodeError:
-            try:
-                with open(file_path, 'r', encoding='latin-1') as file:
-                    return file.read()
-            except Exception as e:
-                logger.error(f"❌ TXT extraction failed: {e}")
-                return ""
+        PDF page ranges are all submitted to the extraction process pool up
+        front and yielded in order as they finish, so downstream chunking and
+        embedding overlap with extraction of later pages. Other types yield
+        their whole text as a single piece.
+        """
+        if document.file_type.lower() != 'pdf':
+            yield await self.extract_text_from_file(document.file_path, document.file_type), None
+            return
 
-    async def _extract_image_text(self, file_path: str) -> str:
+        page_count = await cpu_executors.run_extraction(extractors.count_pdf_pages, document.file_path)
+        progress_tracker.update(document.id, pages_total=page_count)
+        step = max(1, settings.pdf_pages_per_task)
+        tasks = [
+            asyncio.ensure_future(cpu_executors.run_extraction(
+                extractors.extract_pdf_page_range, document.file_path, start, start + step
+            ))
+            for start in range(0, page_count, step)
+        ]
         try:
-            image = cv2.imread(file_path)
-            if image is None:
-                pil_image = Image.open(file_path)
-                image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            text = pytesseract.image_to_string(thresh, config='--psm 6')
-            logger.info(f"✅ OCR extracted {len(text)} characters from image")
-            return text.strip()
-        except Exception as e:
-            logger.error(f"❌ Image OCR failed: {e}")
-            return ""
+            for task in tasks:
+                for page in await task:
+                    yield page["text"], {key: page[key] for key in ("page", "ocr", "seconds")}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    async def _single_segment(text: str) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        yield text, None
+
+    async def _index_chunks(self, document: Document, chunks: List[str], embeddings: np.ndarray, db: Session,
+                            start_index: int = 0) -> float:
+        """Write chunk rows and vectors for a document; returns seconds spent in the vector store"""
+        collection = self.get_user_collection(document.user_id, create=True)
+        created_at = datetime.now().isoformat()
+        indexes = range(start_index, start_index + len(chunks))
+        chunk_ids = [f"doc_{document.id}_chunk_{i}" for i in indexes]
+        metadatas = [{
+            "document_id": document.id,
+            "chunk_index": i,
+            "filename": document.original_filename,
+            "file_type": document.file_type,
+            "created_at": created_at
+        } for i in indexes]
+        for offset, chunk in enumerate(chunks):
+            db.add(DocumentChunk(
+                document_id=document.id,
+                chunk_text=chunk,
+                chunk_index=start_index + offset,
+                embedding=embeddings[offset, :50].tolist(),  # Store first 50 dims for reference
+                doc_metadata={"chunk_id": chunk_ids[offset]}
+            ))
 
-    async def process_document(self, document: Document, db: Session) -> bool:
+        index_started = time.perf_counter()
+        await cpu_executors.run_embedding(
+            lambda: collection.add(
+                ids=chunk_ids,
+                embeddings=embeddings.tolist(),
+                metadatas=metadatas,
+                documents=chunks
+            )
+        )
+        if self.keyword_index is not None:
+            await cpu_executors.run_embedding(self.keyword_index.add, document.user_id, chunk_ids, chunks, metadatas)
+        self.response_cache.invalidate_user(document.user_id)
+        return time.perf_counter() - index_started
+
+    async def _share_from_identical_document(self, document: Document, db: Session) -> bool:
+        """Copy text and vectors from an already processed byte-identical upload by another user"""
+        if not settings.dedup_share_across_users or not document.content_hash:
+            return False
+        donor = (
+            db.query(Document)
+            .filter(
+                Document.content_hash == document.content_hash,
+                Document.id != document.id,
+                Document.processing_status == "completed"
+            )
+            .first()
+        )
+        if donor is None:
+            return False
+
+        donor_collection = self.get_user_collection(donor.user_id)
+        if donor_collection is None:
+            return False
+        results = await cpu_executors.run_embedding(
+            lambda: donor_collection.get(
+                where={"document_id": donor.id},
+                include=["embeddings", "documents", "metadatas"]
+            )
+        )
+        if not results['ids']:
+            return False
+
+        order = sorted(range(len(results['ids'])), key=lambda i: results['metadatas'][i]["chunk_index"])
+        chunks = [results['documents'][i] for i in order]
+        embeddings = np.asarray([results['embeddings'][i] for i in order], dtype=np.float32)
+        index_seconds = await self._index_chunks(document, chunks, embeddings, db)
+
+        document.extracted_text = donor.extracted_text
+        document.doc_metadata = {
+            **(document.doc_metadata or {}),
+            "ingest_metrics": {
+                "chunks": len(chunks),
+                "shared_from_document": donor.id,
+                "index_seconds": round(index_seconds, 3)
+            }
+        }
+        document.processing_status = "completed"
+        db.commit()
+        progress_tracker.update(document.id, chunks_embedded=len(chunks), vectors_written=len(chunks))
+        logger.info(f"♻️ Reused {len(chunks)} chunks from identical document {donor.id} for {document.original_filename}")
+        return True
+
+    async def process_document(self, document: Document, db: Session,
+                               progress_callback: Optional[Callable[[float], None]] = None) -> bool:
+        """Extract, chunk, embed and index a document; ``progress_callback`` receives percent done"""
         logger.info(f"🔄 Processing document: {document.original_filename}")
         try:
             document.processing_status = "processing"
             db.commit()
-            extracted_text = await self.extract_text_from_file(document.file_path, document.file_type)
-            if not extracted_text.strip():
+            progress_tracker.claim(document.id, document.user_id, stage="extracting")
+            # Drop output of any earlier attempt so retries and reprocessing are idempotent
+            self.delete_document_from_vector_store(document.id, document.user_id)
+            db.query(DocumentChunk).filter(DocumentChunk.document_id == document.id).delete(synchronize_session=False)
+            if await self._share_from_identical_document(document, db):
+                return True
+            file_hash = await self._document_file_hash(document) if self.content_cache else None
+            cached_text = self.content_cache.get_text(file_hash) if self.content_cache else None
+            if cached_text is not None:
+                logger.info(f"♻️ Reusing extracted text for {document.original_filename}")
+
+            # Stream pieces through chunking, batched embedding and incremental index flushes
+            text_splitter = splitter_for_file_type(document.file_type)
+            # Pages are joined with the splitter's separator; cached text always keeps the
+            # "\f" page breaks so it serves every strategy
+            separator = getattr(text_splitter, "segment_separator", "\n")
+            if cached_text is not None:
+                cached_text = cached_text.replace(PAGE_BREAK, separator)
+            splitter = IncrementalSplitter(text_splitter.split_text, separator=separator)
+            text_parts, pages, pending = [], [], []
+            stats = {"chunks": 0, "embedded": 0, "cached_chunks": 0, "embedding_seconds": 0.0, "index_seconds": 0.0,
+                     "flushes": 0, "extraction_done": cached_text is not None}
+
+            def report_progress(stage: Optional[str] = None):
+                # First half of the bar tracks extraction, second half chunks written
+                # out of those known so far (so it only firms up as pages arrive)
+                pages_total = (progress_tracker.get(document.id) or {}).get("pages_total")
+                if stats["extraction_done"]:
+                    extracted = 1.0
+                else:
+                    extracted = len(pages) / pages_total if pages_total else 0.0
+                known = stats["chunks"] + len(pending)
+                written = stats["chunks"] / known if known else 0.0
+                fields = {
+                    "pages_extracted": len(pages),
+                    "chunks_embedded": stats["embedded"],
+                    "vectors_written": stats["chunks"],
+                    "percent": 50.0 * extracted * (1.0 + written)
+                }
+                if stage:
+                    fields["stage"] = stage
+                progress_tracker.update(document.id, **fields)
+                if progress_callback is not None:
+                    progress_callback(fields["percent"])
+
+            async def flush(batch: List[str]):
+                report_progress("embedding")
+                embed_started = time.perf_counter()
+                embeddings, cached = await cpu_executors.run_embedding(self.embed_chunks, batch)
+                stats["embedding_seconds"] += time.perf_counter() - embed_started
+                stats["embedded"] += len(batch)
+                report_progress("indexing")
+                stats["index_seconds"] += await self._index_chunks(
+                    document, batch, embeddings, db, start_index=stats["chunks"]
+                )
+                db.commit()
+                stats["chunks"] += len(batch)
+                stats["cached_chunks"] += cached
+                stats["flushes"] += 1
+                report_progress("extracting" if not stats["extraction_done"] else None)
+
+            started = time.perf_counter()
+            segments = self._single_segment(cached_text) if cached_text is not None else self.iter_document_segments(document)
+            async for segment, page in segments:
+                if page is not None:
+                    pages.append(page)
+                else:
+                    stats["extraction_done"] = True
+                if not segment:
+                    continue
+                text_parts.append(segment)
+                pending.extend(splitter.feed(segment))
+                report_progress()
+                while len(pending) >= settings.ingest_flush_chunks:
+                    batch, pending = pending[:settings.ingest_flush_chunks], pending[settings.ingest_flush_chunks:]
+                    await flush(batch)
+            stats["extraction_done"] = True
+            pending.extend(splitter.finish())
+            if pending:
+                await flush(pending)
+
+            extracted_text = separator.join(text_parts).strip()
+            if not extracted_text:
                 document.processing_status = "failed"
                 db.commit()
                 logger.warning(f"⚠️ No text extracted from {document.original_filename}")
                 return False
             document.extracted_text = extracted_text
-            chunks = self.text_splitter.split_text(extracted_text)
-            logger.info(f"📄 Created {len(chunks)} chunks from document")
-            collection = self.get_user_collection(document.user_id)
-            chunk_ids, embeddings, metadatas, documents_text = [], [], [], []
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"doc_{document.id}_chunk_{i}"
-                chunk_ids.append(chunk_id)
-                embedding = self.embedding_model.encode(chunk).tolist()
-                embeddings.append(embedding)
-                documents_text.append(chunk)
-                metadatas.append({
-                    "document_id": document.id,
-                    "chunk_index": i,
-                    "filename": document.original_filename,
-                    "file_type": document.file_type,
-                    "created_at": datetime.now().isoformat()
-                })
-                db_chunk = DocumentChunk(
-                    document_id=document.id,
-                    chunk_text=chunk,
-                    chunk_index=i,
-                    embedding=embedding[:50],  # Store first 50 dims for reference
-                    metadata={"chunk_id": chunk_id}
-                )
-                db.add(db_chunk)
-            collection.add(
-                ids=chunk_ids,
-                embeddings=embeddings,
-                metadatas=metadatas,
-                documents=documents_text
+            if self.content_cache is not None and cached_text is None:
+                self.content_cache.put_text(file_hash, document.file_type, PAGE_BREAK.join(text_parts).strip())
+
+            embedded_chunks = stats["chunks"] - stats["cached_chunks"]
+            embed_seconds = stats["embedding_seconds"]
+            chunks_per_second = embedded_chunks / embed_seconds if embedded_chunks and embed_seconds > 0 else None
+            document.doc_metadata = {
+                **(document.doc_metadata or {}),
+                "ingest_metrics": {
+                    "total_seconds": round(time.perf_counter() - started, 3),
+                    "chunks": stats["chunks"],
+                    "chunk_strategy": settings.chunk_strategy_for(document.file_type),
+                    "cached_chunks": stats["cached_chunks"],
+                    "flushes": stats["flushes"],
+                    "embedding_batch_size": settings.embedding_batch_size,
+                    "embedding_seconds": round(embed_seconds, 3),
+                    "index_seconds": round(stats["index_seconds"], 3),
+                    "chunks_per_second": round(chunks_per_second, 1) if chunks_per_second else None
+                },
+                **({"pages": pages} if pages else {})
+            }
+            logger.info(
+                f"⚡ Embedded {embedded_chunks} chunks ({stats['cached_chunks']} cached) "
+                f"in {stats['flushes']} flushes, {embed_seconds:.2f}s"
+                + (f" ({chunks_per_second:.1f} chunks/s)" if chunks_per_second else "")
             )
             document.processing_status = "completed"
             db.commit()
@@ -213,77 +423,194 @@ class RAGService:
             db.commit()
             return False
 
-    def retrieve_relevant_chunks(self, query: str, user_id: int, n_results: int = 5) -> List[Dict[str, Any]]:
+    async def _aquery_collection(self, query_embedding: np.ndarray, user_id: int, n_results: int) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, self._query_collection, query_embedding, user_id, n_results
+        )
+
+    def _query_collection(self, query_embedding: np.ndarray, user_id: int, n_results: int) -> List[Dict[str, Any]]:
+        collection = self.get_user_collection(user_id)
+        if collection is None:
+            logger.info("📭 No documents in user collection")
+            return []
+        # No count() first: every backend returns fewer than n_results when it holds fewer
+        results = collection.query(
+            query_embeddings=[query_embedding.tolist()],
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"]
+        )
+        if not results['documents'] or not results['documents'][0]:
+            logger.info("📭 No documents in user collection")
+            return []
+        relevant_chunks = []
+        for i, (chunk_id, doc, metadata, distance) in enumerate(zip(
+            results['ids'][0],
+            results['documents'][0],
+            results['metadatas'][0],
+            results['distances'][0]
+        )):
+            relevant_chunks.append({
+                "id": chunk_id,
+                "text": doc,
+                "metadata": metadata,
+                "similarity_score": 1 / (1 + distance),  # Convert distance to similarity
+                "rank": i + 1
+            })
+        logger.info(f"🔍 Retrieved {len(relevant_chunks)} relevant chunks")
+        return relevant_chunks
+
+    async def _ahybrid_retrieve(self, query: str, query_embedding: np.ndarray, user_id: int,
+                                n_results: int) -> List[Dict[str, Any]]:
+        """Dense and BM25 retrieval in parallel, fused by reciprocal rank.
+
+        Keyword results that aren't ready within ``hybrid_keyword_budget_ms``
+        (or once dense retrieval finishes, whichever is later) are dropped
+        and the dense ranking is used alone.
+        """
+        if self.keyword_index is None:
+            return await self._aquery_collection(query_embedding, user_id, n_results)
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        candidates = max(settings.hybrid_candidates, n_results)
+        keyword_future = loop.run_in_executor(
+            None, self._keyword_search, query, user_id, candidates
+        )
+        dense = await self._aquery_collection(query_embedding, user_id, candidates)
+        remaining = settings.hybrid_keyword_budget_ms / 1000 - (time.perf_counter() - started)
         try:
-            collection = self.get_user_collection(user_id)
-            count = collection.count()
-            if count == 0:
-                logger.info("📭 No documents in user collection")
-                return []
-            query_embedding = self.embedding_model.encode(query).tolist()
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=min(n_results, count),
-                include=["documents", "metadatas", "distances"]
-            )
-            relevant_chunks = []
-            if results['documents'] and results['documents'][0]:
-                for i, (doc, metadata, distance) in enumerate(zip(
-                    results['documents'][0],
-                    results['metadatas'][0],
-                    results['distances'][0]
-                )):
-                    relevant_chunks.append({
-                        "text": doc,
-                        "metadata": metadata,
-                        "similarity_score": 1 / (1 + distance),  # Convert distance to similarity
-                        "rank": i + 1
-                    })
-            logger.info(f"🔍 Retrieved {len(relevant_chunks)} relevant chunks")
-            return relevant_chunks
+            keyword = await asyncio.wait_for(keyword_future, timeout=max(0.0, remaining))
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Keyword search over budget ({settings.hybrid_keyword_budget_ms}ms), using vectors only")
+            keyword = []
         except Exception as e:
-            logger.error(f"❌ Retrieval failed: {e}")
-            return []
+            logger.error(f"❌ Keyword search failed: {e}")
+            keyword = []
+        return await loop.run_in_executor(
+            None, self._fuse_results, dense, keyword, query_embedding, user_id, n_results
+        )
+
+    def _keyword_search(self, query: str, user_id: int, n: int) -> List[Dict[str, Any]]:
+        if not self.keyword_index.is_backfilled(user_id):
+            self._backfill_keyword_index(user_id)
+        return self.keyword_index.search(user_id, query, n)
+
+    def _backfill_keyword_index(self, user_id: int):
+        """Index chunks that were stored before hybrid search was enabled, once per user"""
+        collection = self.get_user_collection(user_id)
+        if collection is not None:
+            results = collection.get(include=["documents", "metadatas"])
+            if results['ids']:
+                self.keyword_index.add(user_id, results['ids'], results['documents'], results['metadatas'])
+                logger.info(f"🔤 Backfilled keyword index for user {user_id} with {len(results['ids'])} chunks")
+        self.keyword_index.mark_backfilled(user_id)
+
+    def _fuse_results(self, dense: List[Dict[str, Any]], keyword: List[Dict[str, Any]],
+                      query_embedding: np.ndarray, user_id: int, n_results: int) -> List[Dict[str, Any]]:
+        if not keyword:
+            return dense[:n_results]
+        by_id = {chunk["id"]: {**chunk, "retrieval": "dense"} for chunk in dense}
+        for chunk in keyword:
+            if chunk["id"] in by_id:
+                by_id[chunk["id"]].update(retrieval="hybrid", keyword_score=chunk["keyword_score"])
+            else:
+                by_id[chunk["id"]] = {**chunk, "retrieval": "keyword"}
+        fused = reciprocal_rank_fusion(
+            [[chunk["id"] for chunk in dense], [chunk["id"] for chunk in keyword]], k=settings.rrf_k
+        )[:n_results]
+
+        results = []
+        for rank, (chunk_id, score) in enumerate(fused, start=1):
+            results.append({**by_id[chunk_id], "rrf_score": round(score, 5), "rank": rank})
+
+        # Keyword-only hits get their vector similarity too, so scores stay comparable
+        keyword_only = [chunk for chunk in results if "similarity_score" not in chunk]
+        if keyword_only:
+            similarities = {}
+            collection = self.get_user_collection(user_id)
+            if collection is not None:
+                stored = collection.get(ids=[chunk["id"] for chunk in keyword_only], include=["embeddings"])
+                for chunk_id, embedding in zip(stored['ids'], stored['embeddings']):
+                    cosine = float(np.dot(np.asarray(embedding, dtype=np.float32), query_embedding))
+                    similarities[chunk_id] = 1 / (1 + max(0.0, 2.0 - 2.0 * cosine))
+            for chunk in keyword_only:
+                chunk["similarity_score"] = similarities.get(chunk["id"], 0.0)
+        logger.info(
+            f"🔀 Fused {len(dense)} vector and {len(keyword)} keyword hits into {len(results)} chunks"
+        )
+        return results
 
     def _is_context_low_quality(self, relevant_chunks):
         if not relevant_chunks:
             return True
+        # An exact keyword match is evidence on its own; judge vector similarity on the rest
+        if any(chunk.get("keyword_score") for chunk in relevant_chunks):
+            return False
         avg_score = sum(chunk["similarity_score"] for chunk in relevant_chunks) / len(relevant_chunks)
         return avg_score < 0.3
 
-    async def generate_rag_response(self, query: str, user_id: int) -> Dict[str, Any]:
+    async def prepare_rag_prompt(self, query: str, user_id: int,
+                                 history: Optional[ConversationHistory] = None) -> Dict[str, Any]:
+        """Retrieve context for a query and build the prompt sent to Gemini.
+
+        With ``history``, retrieval runs on the question condensed with the
+        previous user turns and the prompt carries a token-capped transcript.
+        Also returns the query embedding and a fingerprint of the chunks used,
+        which together key the semantic response cache.
+        """
+        history_used = history is not None and not history.empty
+        retrieval_query = history.retrieval_query(query) if history_used else query
+        history_text = history.render(settings.history_token_budget) if history_used else ""
+        query_embedding = None
         try:
-            if not self.gemini_model:
-                return {
-                    "response": "❌ Gemini API not configured. Please set GEMINI_API_KEY.",
-                    "sources": [],
-                    "error": "No API key"
-                }
-            relevant_chunks = self.retrieve_relevant_chunks(query, user_id)
-            if not relevant_chunks or self._is_context_low_quality(relevant_chunks):
-                response = self.gemini_model.generate_content(query)
-                return {
-                    "response": response.text,
-                    "sources": [],
-                    "context_used": False
-                }
-            context_parts = []
-            sources = []
-            for chunk in relevant_chunks[:5]:
-                context_parts.append(f"Source: {chunk['metadata']['filename']}\n{chunk['text']}")
-                sources.append({
-                    "filename": chunk['metadata']['filename'],
-                    "document_id": chunk['metadata']['document_id'],
-                    "similarity_score": chunk['similarity_score'],
-                    "chunk_preview": chunk['text'][:200] + "..." if len(chunk['text']) > 200 else chunk['text']
-                })
-            context = "\n\n".join(context_parts)
-            rag_prompt = f"""You are a helpful AI assistant that answers questions based on the provided context from the user's documents.
+            query_embedding = await self.encode_query(retrieval_query)
+            if self.reranker is not None:
+                candidates = await self._ahybrid_retrieve(
+                    retrieval_query, query_embedding, user_id, settings.rerank_candidates
+                )
+                relevant_chunks = await self.reranker.arerank(
+                    retrieval_query, candidates, settings.rerank_max_chunks, settings.rerank_token_budget
+                )
+            else:
+                relevant_chunks = await self._ahybrid_retrieve(
+                    retrieval_query, query_embedding, user_id, settings.retrieval_top_k
+                )
+        except Exception as e:
+            logger.error(f"❌ Retrieval failed: {e}")
+            relevant_chunks = []
+        if not relevant_chunks or self._is_context_low_quality(relevant_chunks):
+            prompt = f"Conversation so far:\n{history_text}\n\nUser: {query}" if history_text else query
+            return {
+                "prompt": prompt,
+                "sources": [],
+                "context_used": False,
+                "chunks_retrieved": 0,
+                "prompt_tokens": count_tokens(prompt),
+                "history_used": history_used,
+                "query_embedding": query_embedding,
+                "fingerprint": SemanticResponseCache.fingerprint([])
+            }
+        built = build_context(relevant_chunks, settings.context_token_budget, settings.context_dedup_threshold)
+        sources = []
+        for block in built["blocks"]:
+            source = {
+                "filename": block['metadata']['filename'],
+                "document_id": block['metadata']['document_id'],
+                "similarity_score": block['similarity_score'],
+                "chunks": len(block['ids']),
+                "chunk_preview": block['text'][:200] + "..." if len(block['text']) > 200 else block['text']
+            }
+            if "rerank_score" in block:
+                source["rerank_score"] = block["rerank_score"]
+            sources.append(source)
+        context = built["context"]
+        conversation = f"Conversation so far:\n{history_text}\n\n" if history_text else ""
+        rag_prompt = f"""You are a helpful AI assistant that answers questions based on the provided context from the user's documents.
 
 Context from uploaded documents:
 {context}
 
-User Question: {query}
+{conversation}User Question: {query}
 
 Instructions:
 - Answer the question based ONLY on the information provided in the context above
@@ -293,13 +620,64 @@ Instructions:
 - If multiple documents contain relevant information, synthesize the information appropriately
 
 Answer:"""
-            response = self.gemini_model.generate_content(rag_prompt)
-            return {
-                "response": response.text,
-                "sources": sources,
-                "context_used": True,
-                "chunks_retrieved": len(relevant_chunks)
+        prompt_tokens = count_tokens(rag_prompt)
+        logger.info(
+            f"🧮 Prompt {prompt_tokens} tokens: {built['context_tokens']} context in {len(built['blocks'])} blocks "
+            f"({built['chunks_merged']} chunks merged, {built['duplicates_dropped']} duplicates dropped, "
+            f"{built['blocks_truncated']} truncated)"
+        )
+        return {
+            "prompt": rag_prompt,
+            "sources": sources,
+            "context_used": True,
+            "chunks_retrieved": len(relevant_chunks),
+            "prompt_tokens": prompt_tokens,
+            "context_tokens": built["context_tokens"],
+            "history_used": history_used,
+            "query_embedding": query_embedding,
+            "fingerprint": SemanticResponseCache.fingerprint(
+                [chunk_id for block in built["blocks"] for chunk_id in block["ids"]]
+            )
+        }
+
+    @staticmethod
+    def _cacheable(prepared: Dict[str, Any]) -> bool:
+        # Answers that depend on earlier turns aren't reusable for other conversations
+        return (settings.response_cache_enabled and prepared.get("query_embedding") is not None
+                and not prepared.get("history_used"))
+
+    def _cached_response(self, user_id: int, prepared: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not self._cacheable(prepared):
+            return None
+        return self.response_cache.lookup(user_id, prepared["query_embedding"], prepared["fingerprint"])
+
+    def _cache_response(self, user_id: int, prepared: Dict[str, Any], response: Dict[str, Any]):
+        if self._cacheable(prepared):
+            self.response_cache.store(user_id, prepared["query_embedding"], prepared["fingerprint"], response)
+
+    async def generate_rag_response(self, query: str, user_id: int,
+                                    history: Optional[ConversationHistory] = None) -> Dict[str, Any]:
+        try:
+            if not self.llm_client.available:
+                return {
+                    "response": "❌ Gemini API not configured. Please set GEMINI_API_KEY.",
+                    "sources": [],
+                    "error": "No API key"
+                }
+            prepared = await self.prepare_rag_prompt(query, user_id, history)
+            cached = self._cached_response(user_id, prepared)
+            if cached:
+                return {**cached, "prompt_tokens": 0, "cached": True}
+            response_text = await self.llm_client.generate(prepared["prompt"])
+            result = {
+                "response": response_text,
+                "sources": prepared["sources"],
+                "context_used": prepared["context_used"],
+                "chunks_retrieved": prepared["chunks_retrieved"],
+                "prompt_tokens": prepared["prompt_tokens"]
             }
+            self._cache_response(user_id, prepared, result)
+            return result
         except Exception as e:
             logger.error(f"❌ RAG response generation failed: {e}", exc_info=True)
             return {
@@ -308,44 +686,69 @@ Answer:"""
                 "error": str(e)
             }
 
+    async def stream_rag_response(self, query: str, user_id: int, use_context: bool = True,
+                                  history: Optional[ConversationHistory] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a ``sources`` event, then ``token`` events as the LLM streams, then ``done``"""
+        if not self.llm_client.available:
+            yield {"type": "error", "error": "❌ Gemini API not configured. Please set GEMINI_API_KEY."}
+            return
+        try:
+            if use_context:
+                prepared = await self.prepare_rag_prompt(query, user_id, history)
+            else:
+                prepared = {
+                    "prompt": query,
+                    "sources": [],
+                    "context_used": False,
+                    "chunks_retrieved": 0,
+                    "prompt_tokens": count_tokens(query)
+                }
+            cached = self._cached_response(user_id, prepared)
+            yield {
+                "type": "sources",
+                "sources": prepared["sources"],
+                "context_used": prepared["context_used"],
+                "chunks_retrieved": prepared["chunks_retrieved"],
+                "prompt_tokens": 0 if cached else prepared["prompt_tokens"]
+            }
+            if cached:
+                yield {"type": "token", "text": cached["response"]}
+                yield {"type": "done", "response": cached["response"], "cached": True}
+                return
+            parts = []
+            async for text in self.llm_client.stream(prepared["prompt"]):
+                parts.append(text)
+                yield {"type": "token", "text": text}
+            response_text = "".join(parts)
+            self._cache_response(user_id, prepared, {
+                "response": response_text,
+                "sources": prepared["sources"],
+                "context_used": prepared["context_used"],
+                "chunks_retrieved": prepared["chunks_retrieved"],
+                "prompt_tokens": prepared["prompt_tokens"]
+            })
+            yield {"type": "done", "response": response_text}
+        except Exception as e:
+            logger.error(f"❌ RAG streaming failed: {e}", exc_info=True)
+            yield {"type": "error", "error": f"❌ Sorry, I encountered an error while generating the response: {str(e)}"}
+
     def delete_document_from_vector_store(self, document_id: int, user_id: int):
         try:
+            if self.keyword_index is not None:
+                self.keyword_index.delete_document(user_id, document_id)
             collection = self.get_user_collection(user_id)
+            if collection is None:
+                return
             results = collection.get(
                 where={"document_id": document_id},
                 include=["metadatas"]
             )
             if results['ids']:
                 collection.delete(ids=results['ids'])
+                self.response_cache.invalidate_user(user_id)
                 logger.info(f"🗑️ Deleted {len(results['ids'])} chunks for document {document_id}")
         except Exception as e:
             logger.error(f"❌ Failed to delete document from vector store: {e}")
 
     def get_collection_stats(self, user_id: int) -> Dict[str, Any]:
-        try:
-            collection = self.get_user_collection(user_id)
-            count = collection.count()
-            if count > 0:
-                sample = collection.get(limit=min(100, count), include=["metadatas"])
-                doc_ids = set()
-                file_types = {}
-                for metadata in sample['metadatas']:
-                    doc_ids.add(metadata.get('document_id'))
-                    file_type = metadata.get('file_type', 'unknown')
-                    file_types[file_type] = file_types.get(file_type, 0) + 1
-                return {
-                    "total_chunks": count,
-                    "total_documents": len(doc_ids),
-                    "file_types": file_types,
-                    "collection_name": f"user_{user_id}_documents"
-                }
-            else:
-                return {
-                    "total_chunks": 0,
-                    "total_documents": 0,
-                    "file_types": {},
-                    "collection_name": f"user_{user_id}_documents"
-                }
-        except Exception as e:
-            logger.error(f"❌ Failed to get collection stats: {e}")
-            return {"error": str(e)}
+        return self.vector_store.collection_stats(user_id)
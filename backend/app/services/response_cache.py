@@ -0,0 +1,114 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class _CacheEntry:
+    user_id: int
+    embedding: np.ndarray
+    fingerprint: str
+    response: Dict[str, Any]
+    created_at: float
+
+
+class SemanticResponseCache:
+    """Per-user cache of RAG answers keyed by query meaning and retrieved context.
+
+    An entry is reused when a new query's (normalized) embedding has cosine
+    similarity >= ``similarity_threshold`` with a cached query *and* retrieval
+    returned exactly the same chunk ids. The fingerprint check also keeps
+    answers correct across worker processes that never see each other's
+    invalidations: a changed document set changes what is retrieved.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: int = 3600, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+        self._by_user: Dict[int, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._user_hits: Dict[int, int] = {}
+        self._user_misses: Dict[int, int] = {}
+
+    @staticmethod
+    def fingerprint(chunk_ids: List[str]) -> str:
+        return hashlib.sha1("|".join(sorted(chunk_ids)).encode("utf-8")).hexdigest()
+
+    def lookup(self, user_id: int, query_embedding: np.ndarray, fingerprint: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            now = time.time()
+            best_id, best_score = None, self.similarity_threshold
+            for entry_id in list(self._by_user.get(user_id, [])):
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    continue
+                if entry.fingerprint != fingerprint:
+                    continue
+                score = float(np.dot(entry.embedding, query_embedding))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                self._user_misses[user_id] = self._user_misses.get(user_id, 0) + 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            self._user_hits[user_id] = self._user_hits.get(user_id, 0) + 1
+            return self._entries[best_id].response
+
+    def store(self, user_id: int, query_embedding: np.ndarray, fingerprint: str, response: Dict[str, Any]):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _CacheEntry(
+                user_id=user_id,
+                embedding=np.asarray(query_embedding, dtype=np.float32),
+                fingerprint=fingerprint,
+                response=response,
+                created_at=time.time()
+            )
+            self._by_user.setdefault(user_id, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        """Drop every cached answer for a user whose document set changed"""
+        with self._lock:
+            for entry_id in list(self._by_user.get(user_id, [])):
+                self._remove(entry_id)
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        user_entries = self._by_user.get(entry.user_id)
+        if user_entries is not None:
+            user_entries.remove(entry_id)
+            if not user_entries:
+                del self._by_user[entry.user_id]
+
+    def get_stats(self, user_id: Optional[int] = None) -> Dict[str, Any]:
+        with self._lock:
+            if user_id is None:
+                hits, misses, entries = self.hits, self.misses, len(self._entries)
+            else:
+                hits = self._user_hits.get(user_id, 0)
+                misses = self._user_misses.get(user_id, 0)
+                entries = len(self._by_user.get(user_id, []))
+        total = hits + misses
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,39 @@
+import functools
+from typing import List
+
+from app.core.config import settings
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character estimate if tiktoken is missing
+    tiktoken = None
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(name: str):
+    return tiktoken.get_encoding(name)
+
+
+def count_tokens(text: str) -> int:
+    """Token count for prompt budgeting.
+
+    Gemini's tokenizer isn't available offline, so ``token_encoding``
+    (cl100k_base by default) is used as a close proxy.
+    """
+    if not text:
+        return 0
+    if tiktoken is None:
+        return max(1, len(text) // 4)
+    return len(_encoding(settings.token_encoding).encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut ``text`` to at most ``max_tokens`` tokens"""
+    if max_tokens <= 0:
+        return ""
+    if tiktoken is None:
+        return text[:max_tokens * 4]
+    tokens: List[int] = _encoding(settings.token_encoding).encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return _encoding(settings.token_encoding).decode(tokens[:max_tokens])
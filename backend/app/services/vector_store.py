@@ -0,0 +1,806 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.quantization import create_quantizer, pq_subquantizer_count
+
+try:
+    import faiss
+except ImportError:  # faiss-cpu is only needed for vector_db_type="faiss"
+    faiss = None
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; writers are then only serialized within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def collection_name(user_id: int) -> str:
+    return f"user_{user_id}_documents"
+
+
+def shard_for_user(user_id: int, shard_count: int) -> int:
+    return user_id % shard_count
+
+
+def shard_collection_name(shard: int) -> str:
+    return f"shard_{shard:03d}_documents"
+
+
+class TenantCollection:
+    """One user's view of a shared shard collection.
+
+    Every record carries ``user_id`` in its metadata and every read, query
+    and delete is filtered on it, so tenants sharing a shard never see each
+    other's chunks. Chunk ids are globally unique (they embed the document id).
+    """
+
+    def __init__(self, collection, user_id: int):
+        self.collection = collection
+        self.user_id = user_id
+        self.name = collection.name
+
+    def _where(self, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if not where:
+            return {"user_id": self.user_id}
+        return {"$and": [{"user_id": self.user_id}, *({key: value} for key, value in where.items())]}
+
+    def add(self, ids: List[str], embeddings, metadatas: List[Dict[str, Any]], documents: List[str]):
+        metadatas = [{**(metadata or {}), "user_id": self.user_id} for metadata in metadatas]
+        self.collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        return self.collection.get(
+            ids=ids, where=self._where(where), limit=limit, include=include or ["metadatas", "documents"]
+        )
+
+    def query(self, query_embeddings, n_results: int = 10, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=self._where(),
+            include=include or ["metadatas", "documents", "distances"]
+        )
+
+    def delete(self, ids: List[str]):
+        self.collection.delete(ids=ids, where=self._where())
+
+    def count(self) -> int:
+        # Chroma has no filtered count; an id-only get is a metadata (SQLite) lookup
+        return len(self.collection.get(where=self._where(), include=[])["ids"])
+
+
+class VectorStore:
+    """Per-user vector collections behind one small interface.
+
+    ``get_collection`` returns an object with the subset of the ChromaDB
+    collection API that RAGService uses (``add``, ``get``, ``query``,
+    ``delete``, ``count``), so the backend is a configuration choice.
+
+    Handles are cached per process by user id, so the hot retrieval path is
+    one dict lookup. Collections are only created explicitly, when a user's
+    first document is indexed; a user without one gets ``None``. Handles
+    idle for ``collection_cache_idle_seconds`` are evicted, as are the least
+    recently used ones beyond ``collection_cache_max_handles``.
+    """
+
+    backend = "base"
+
+    def __init__(self):
+        self._handles: "OrderedDict[int, Any]" = OrderedDict()
+        self._last_used: Dict[int, float] = {}
+        self._handles_lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_collection(self, user_id: int, create: bool = False):
+        now = time.monotonic()
+        with self._handles_lock:
+            handle = self._handles.get(user_id)
+            if handle is not None:
+                self._handles.move_to_end(user_id)
+                self._last_used[user_id] = now
+                self.hits += 1
+                self._evict_idle(now)
+                return handle
+            self.misses += 1
+
+        handle = self._open_collection(user_id, create)
+        if handle is None:
+            return None
+        with self._handles_lock:
+            # Another thread may have opened it meanwhile; keep the first handle
+            handle = self._handles.setdefault(user_id, handle)
+            self._last_used[user_id] = now
+            while len(self._handles) > settings.collection_cache_max_handles:
+                self._evict(next(iter(self._handles)))
+        return handle
+
+    def create_collection(self, user_id: int):
+        """Create (or open) a user's collection and cache its handle"""
+        return self.get_collection(user_id, create=True)
+
+    def _open_collection(self, user_id: int, create: bool):
+        """Open a backend collection; None if it doesn't exist and ``create`` is False"""
+        raise NotImplementedError
+
+    def _evict_idle(self, now: float):
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        idle = [
+            user_id for user_id, last_used in self._last_used.items()
+            if now - last_used > settings.collection_cache_idle_seconds
+        ]
+        for user_id in idle:
+            self._evict(user_id)
+
+    def _evict(self, user_id: int):
+        self._handles.pop(user_id, None)
+        self._last_used.pop(user_id, None)
+        self.evictions += 1
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "handles": len(self._handles),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+    def collection_stats(self, user_id: int) -> Dict[str, Any]:
+        """Chunk, document and file type counts of a user's collection (no embedding model needed)"""
+        try:
+            collection = self.get_collection(user_id)
+            count = collection.count() if collection is not None else 0
+            if count > 0:
+                sample = collection.get(limit=min(100, count), include=["metadatas"])
+                doc_ids = set()
+                file_types = {}
+                for metadata in sample['metadatas']:
+                    doc_ids.add(metadata.get('document_id'))
+                    file_type = metadata.get('file_type', 'unknown')
+                    file_types[file_type] = file_types.get(file_type, 0) + 1
+                return {
+                    "total_chunks": count,
+                    "total_documents": len(doc_ids),
+                    "file_types": file_types,
+                    "collection_name": collection.name
+                }
+            else:
+                return {
+                    "total_chunks": 0,
+                    "total_documents": 0,
+                    "file_types": {},
+                    "collection_name": collection.name if collection is not None else collection_name(user_id)
+                }
+        except Exception as e:
+            logger.error(f"❌ Failed to get collection stats: {e}")
+            return {"error": str(e)}
+
+    def heartbeat(self):
+        """Raise if the store is unusable"""
+
+    def close(self):
+        """Flush and release resources on shutdown"""
+        with self._handles_lock:
+            self._handles.clear()
+            self._last_used.clear()
+
+
+class ChromaVectorStore(VectorStore):
+    """ChromaDB collections, either one per user or ``shard_count`` shared shards.
+
+    The sharded layout routes each user to ``shard_<n>_documents`` by
+    ``shard_for_user`` and filters on ``user_id`` metadata, which keeps the
+    number of collections (and their HNSW indexes and file handles) fixed no
+    matter how many tenants there are.
+    """
+
+    backend = "chromadb"
+
+    def __init__(self, path: str, layout: str = "per_user", shard_count: int = 16):
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+
+        if layout not in ("per_user", "sharded"):
+            raise ValueError(f"Unknown vector_collection_layout: {layout}")
+        super().__init__()
+        self.layout = layout
+        self.shard_count = max(1, shard_count)
+        self._shards: Dict[int, Any] = {}
+        self.client = chromadb.PersistentClient(
+            path=path,
+            settings=ChromaSettings(anonymized_telemetry=False)
+        )
+
+    def get_shard(self, shard: int):
+        collection = self._shards.get(shard)
+        if collection is None:
+            collection = self.client.get_or_create_collection(
+                name=shard_collection_name(shard), metadata={"shard": shard}
+            )
+            self._shards[shard] = collection
+        return collection
+
+    def _open_collection(self, user_id: int, create: bool):
+        if self.layout == "sharded":
+            # Shards are shared, so a user's view always exists (and is empty until first upload)
+            return TenantCollection(self.get_shard(shard_for_user(user_id, self.shard_count)), user_id)
+        name = collection_name(user_id)
+        if create:
+            return self.client.get_or_create_collection(name=name, metadata={"user_id": user_id})
+        try:
+            return self.client.get_collection(name)
+        except ValueError:
+            # Chroma raises ValueError for a collection that doesn't exist
+            return None
+
+    def heartbeat(self):
+        self.client.heartbeat()
+
+
+class LocalCollection:
+    """One user's vectors in an append-only float32 file with metadata in SQLite.
+
+    Row ``i`` of ``user_<id>.f32`` is the i-th vector ever added; the file is
+    memory-mapped for queries, so resident memory stays with the OS page
+    cache. Deleted rows are simply absent from SQLite and masked out, and the
+    file is compacted once they outnumber the live rows. Vectors are expected
+    to be L2-normalized: scores are inner products and distances are
+    reported like Chroma's squared L2 (``2 - 2 * cosine``).
+
+    With ``vector_quantization`` set, the NumPy backend scans a parallel file
+    of int8 or PQ codes instead and re-scores the best
+    ``k * quantization_rescore_factor`` candidates with the float vectors, so
+    only those rows of the float file are read.
+
+    Several processes may hold handles on the same collection. Writers take
+    an exclusive file lock and bump the collection's ``generation`` in
+    SQLite (and its ``epoch`` when a compaction renumbers rows); every read
+    and write first compares the generation and reloads the row mask, the
+    memory maps and, after a compaction, the FAISS index when it changed.
+    """
+
+    def __init__(self, store: "LocalVectorStore", user_id: int):
+        self.store = store
+        self.user_id = user_id
+        self.name = collection_name(user_id)
+        self.path = os.path.join(store.path, f"user_{user_id}.f32")
+        self._lock = threading.RLock()
+        self._dim: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._index = None
+        self._index_kind = None
+        self._indexed_rows = 0
+        self.quantizer = None
+        self._codes: Optional[np.memmap] = None
+        self._generation = 0
+        self._epoch = 0
+        self._write_depth = 0
+        self._load()
+
+    # -- persistence -------------------------------------------------------
+
+    def _load(self):
+        rows = self.store.execute(
+            "SELECT dim, generation, epoch FROM collections WHERE user_id = ?", (self.user_id,)
+        )
+        row = rows[0] if rows else None
+        if row is None:
+            return
+        self._dim, self._generation, self._epoch = row
+        if not os.path.exists(self.path):
+            return
+        self._init_quantizer()
+        self._remap()
+        alive_rows = [r for (r,) in self.store.execute("SELECT row FROM chunks WHERE user_id = ?", (self.user_id,))]
+        # Rows a concurrent writer appended but hasn't committed yet stay masked
+        self._alive = np.zeros(self.rows, dtype=bool)
+        if alive_rows:
+            alive_rows = np.asarray(alive_rows, dtype=np.int64)
+            self._alive[alive_rows[alive_rows < self.rows]] = True
+
+    def _sync(self):
+        """Reload if another process changed the collection since this handle last looked"""
+        rows = self.store.execute("SELECT generation, epoch FROM collections WHERE user_id = ?", (self.user_id,))
+        if not rows or rows[0][0] == self._generation:
+            return
+        if rows[0][1] != self._epoch:
+            # Rows were renumbered by a compaction: the index must be rebuilt from scratch
+            self._index, self._index_kind, self._indexed_rows = None, None, 0
+        self._vectors, self._codes = None, None
+        self._load()
+        self._update_index()
+
+    def _bump_generation(self, compacted: bool = False):
+        self.store.execute(
+            "UPDATE collections SET generation = generation + 1"
+            + (", epoch = epoch + 1" if compacted else "") + " WHERE user_id = ?",
+            (self.user_id,), commit=True
+        )
+        self._generation, self._epoch = self.store.execute(
+            "SELECT generation, epoch FROM collections WHERE user_id = ?", (self.user_id,)
+        )[0]
+
+    @contextmanager
+    def _writing(self):
+        """Thread lock plus an exclusive cross-process file lock, then sync with other writers"""
+        with self._lock:
+            if self._write_depth or fcntl is None:
+                self._write_depth += 1
+                try:
+                    self._sync()
+                    yield
+                finally:
+                    self._write_depth -= 1
+                return
+            with open(f"{self.path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._write_depth += 1
+                try:
+                    self._sync()
+                    yield
+                finally:
+                    self._write_depth -= 1
+
+    def _init_quantizer(self):
+        self.quantizer = self.store.new_quantizer(self._dim)
+        if self.quantizer is not None:
+            self.codes_path = os.path.join(self.store.path, f"user_{self.user_id}.{self.quantizer.kind}")
+            self.quantizer_path = f"{self.codes_path}.npy"
+            self.quantizer.load(self.quantizer_path)
+
+    def _remap(self):
+        rows = os.path.getsize(self.path) // (self._dim * 4) if self._dim else 0
+        self._vectors = np.memmap(self.path, dtype=np.float32, mode="r", shape=(rows, self._dim)) if rows else None
+        self._codes = None
+        if self.quantizer is not None and self.quantizer.trained and os.path.exists(self.codes_path):
+            code_rows = os.path.getsize(self.codes_path) // self.quantizer.dtype.itemsize
+            if code_rows:
+                self._codes = np.memmap(self.codes_path, dtype=self.quantizer.dtype, mode="r", shape=(code_rows,))
+
+    @property
+    def rows(self) -> int:
+        return 0 if self._vectors is None else self._vectors.shape[0]
+
+    # -- Chroma-compatible API ---------------------------------------------
+
+    def count(self) -> int:
+        with self._lock:
+            self._sync()
+            return int(self._alive.sum())
+
+    def add(self, ids: List[str], embeddings, metadatas: List[Dict[str, Any]], documents: List[str]):
+        vectors = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("embeddings must be a 2-D array with one row per id")
+        with self._writing():
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self.store.execute(
+                    "INSERT OR IGNORE INTO collections (user_id, dim) VALUES (?, ?)", (self.user_id, self._dim),
+                    commit=True
+                )
+                self._init_quantizer()
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != collection dimension {self._dim}")
+
+            # Re-adding an id replaces it, like Chroma's upsert semantics for our chunk ids
+            self._delete_ids(ids)
+            start = self.rows
+            with open(self.path, "ab") as f:
+                f.write(vectors.tobytes())
+            self.store.executemany(
+                "INSERT OR REPLACE INTO chunks (user_id, chunk_id, row, document_id, text, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (self.user_id, chunk_id, start + i, (metadata or {}).get("document_id"), text,
+                     json.dumps(metadata or {}))
+                    for i, (chunk_id, metadata, text) in enumerate(zip(ids, metadatas, documents))
+                ]
+            )
+            codes_in_step = self._codes is not None and len(self._codes) == start
+            if self.quantizer is not None and self.quantizer.trained and codes_in_step:
+                with open(self.codes_path, "ab") as f:
+                    f.write(self.quantizer.encode(vectors).tobytes())
+            self._remap()
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            if self.quantizer is not None and self.quantizer.trained and not codes_in_step:
+                self._rebuild_codes()
+            if self.quantizer is not None and not self.quantizer.trained and self.rows >= settings.pq_train_min_vectors:
+                self._train_quantizer()
+            self._update_index()
+            self._bump_generation()
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        include = include or ["metadatas", "documents"]
+        sql = "SELECT chunk_id, row, text, metadata FROM chunks WHERE user_id = ?"
+        params: List[Any] = [self.user_id]
+        if ids is not None:
+            sql += f" AND chunk_id IN ({','.join('?' * len(ids))})"
+            params.extend(ids)
+        for key, value in (where or {}).items():
+            if key == "document_id":
+                sql += " AND document_id = ?"
+            else:
+                sql += f" AND json_extract(metadata, '$.{key}') = ?"
+            params.append(value)
+        sql += " ORDER BY row"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            self._sync()
+            rows = self.store.execute(sql, params)
+            embeddings = [self._vectors[r[1]].tolist() for r in rows] if "embeddings" in include else None
+
+        result: Dict[str, Any] = {"ids": [r[0] for r in rows]}
+        if "documents" in include:
+            result["documents"] = [r[2] for r in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(r[3]) for r in rows]
+        if embeddings is not None:
+            result["embeddings"] = embeddings
+        return result
+
+    def delete(self, ids: List[str]):
+        with self._writing():
+            if not self._delete_ids(ids):
+                return
+            live = int(self._alive.sum())
+            if self.rows - live > max(1000, live):
+                self._compact()
+            self._bump_generation()
+
+    def query(self, query_embeddings, n_results: int = 10,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        # Another process may have written the first vectors since this handle was opened
+        with self._lock:
+            self._sync()
+            dim = self._dim
+        if dim is None:
+            count = 1 if queries.ndim == 1 else len(queries)
+            return {key: [[] for _ in range(count)] for key in ("ids", "documents", "metadatas", "distances")}
+        queries = queries.reshape(-1, dim)
+        result: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query in queries:
+            # Held across search and lookup so a compaction can't renumber rows in between
+            with self._lock:
+                self._sync()
+                rows, scores = self._search(query, n_results)
+                by_row = {
+                    r[0]: r[1:] for r in self.store.execute(
+                        f"SELECT row, chunk_id, text, metadata FROM chunks WHERE user_id = ? "
+                        f"AND row IN ({','.join('?' * len(rows))})",
+                        [self.user_id, *[int(r) for r in rows]]
+                    )
+                } if len(rows) else {}
+            hits = [(by_row[int(r)], float(s)) for r, s in zip(rows, scores) if int(r) in by_row]
+            result["ids"].append([hit[0][0] for hit in hits])
+            result["documents"].append([hit[0][1] for hit in hits])
+            result["metadatas"].append([json.loads(hit[0][2]) for hit in hits])
+            result["distances"].append([max(0.0, 2.0 - 2.0 * score) for _, score in hits])
+        return result
+
+    # -- internals ---------------------------------------------------------
+
+    def _delete_ids(self, ids: List[str]) -> int:
+        deleted = 0
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.store.execute(
+                f"SELECT row FROM chunks WHERE user_id = ? AND chunk_id IN ({placeholders})", [self.user_id, *batch]
+            )
+            if not rows:
+                continue
+            self.store.execute(
+                f"DELETE FROM chunks WHERE user_id = ? AND chunk_id IN ({placeholders})", [self.user_id, *batch],
+                commit=True
+            )
+            for (row,) in rows:
+                if row < len(self._alive):
+                    self._alive[row] = False
+            deleted += len(rows)
+        return deleted
+
+    def _search(self, query: np.ndarray, k: int):
+        """Top-k live rows by inner product; returns (rows, scores)"""
+        vectors, alive, index = self._vectors, self._alive, self._index
+        live = int(alive.sum())
+        if vectors is None or live == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        k = min(k, live)
+
+        quantized = self._index_kind is not None and self._index_kind[1] != "none"
+        candidates = k * max(1, settings.quantization_rescore_factor) if quantized else k
+
+        if index is not None:
+            # Over-fetch by the number of deleted rows so masking can't starve the result
+            fetch = min(len(alive), candidates + (len(alive) - live))
+            scores, rows = index.search(query.reshape(1, -1), fetch)
+            rows, scores = rows[0], scores[0]
+            keep = (rows >= 0) & (rows < len(alive))
+            rows, scores = rows[keep], scores[keep]
+            keep = alive[rows]
+            rows, scores = rows[keep][:candidates], scores[keep][:candidates]
+            return self._rescore(vectors, rows, query, k) if quantized else (rows, scores)
+
+        codes = self._codes
+        if codes is not None and len(codes) == len(alive):
+            approx = np.empty(len(codes), dtype=np.float32)
+            for start in range(0, len(codes), 65536):
+                approx[start:start + 65536] = self.quantizer.scores(codes[start:start + 65536], query)
+            approx[~alive] = -np.inf
+            return self._rescore(vectors, self._top(approx, min(live, k * max(1, settings.quantization_rescore_factor))), query, k)
+
+        scores = np.asarray(vectors @ query, dtype=np.float32)
+        scores[~alive[:len(scores)]] = -np.inf
+        top = self._top(scores, k)
+        return top, scores[top]
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    @staticmethod
+    def _rescore(vectors: np.ndarray, rows: np.ndarray, query: np.ndarray, k: int):
+        """Exact inner products for approximate candidates (reads only those float rows)"""
+        rows = np.sort(rows)
+        scores = np.asarray(vectors[rows] @ query, dtype=np.float32)
+        order = np.argsort(-scores)[:k]
+        return rows[order], scores[order]
+
+    def _train_quantizer(self):
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(self.rows, min(self.rows, 65536), replace=False))
+        self.quantizer.train(np.asarray(self._vectors[sample]))
+        self.quantizer.save(self.quantizer_path)
+        self._rebuild_codes()
+        logger.info(f"🗜️ Trained {self.quantizer.kind} quantizer for {self.name} on {len(sample)} vectors")
+
+    def _rebuild_codes(self):
+        """Re-encode every row of the vector file into the codes file"""
+        temp_path = f"{self.codes_path}.tmp"
+        with open(temp_path, "wb") as f:
+            for start in range(0, self.rows, 65536):
+                f.write(self.quantizer.encode(self._vectors[start:start + 65536]).tobytes())
+        self._codes = None
+        os.replace(temp_path, self.codes_path)
+        self._remap()
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Bytes held by the scanned representation, for capacity planning and benchmarks"""
+        float_bytes = self.rows * (self._dim or 0) * 4
+        code_bytes = self._codes.nbytes if self._codes is not None else 0
+        index_bytes = len(faiss.serialize_index(self._index)) if self._index is not None else 0
+        return {
+            "vectors": self.count(),
+            "float_bytes": float_bytes,
+            "code_bytes": code_bytes,
+            "index_bytes": index_bytes,
+            "scanned_bytes": index_bytes or code_bytes or float_bytes,
+        }
+
+    def _update_index(self):
+        self._index, self._index_kind, self._indexed_rows = self.store.update_index(
+            self._index, self._index_kind, self._vectors, self._indexed_rows
+        )
+
+    def _compact(self):
+        """Rewrite the vector file with only live rows and renumber them"""
+        live_rows = np.flatnonzero(self._alive)
+        temp_path = f"{self.path}.compact"
+        with open(temp_path, "wb") as f:
+            for start in range(0, len(live_rows), 65536):
+                f.write(np.ascontiguousarray(self._vectors[live_rows[start:start + 65536]]).tobytes())
+        self.store.executemany(
+            "UPDATE chunks SET row = ? WHERE user_id = ? AND row = ?",
+            [(new, self.user_id, int(old)) for new, old in enumerate(live_rows)]
+        )
+        self._vectors = None
+        os.replace(temp_path, self.path)
+        self._remap()
+        self._alive = np.ones(len(live_rows), dtype=bool)
+        if self.quantizer is not None and self.quantizer.trained:
+            self._rebuild_codes()
+        self._index, self._index_kind, self._indexed_rows = None, None, 0
+        self._update_index()
+        self._bump_generation(compacted=True)
+        logger.info(f"🧹 Compacted {self.name}: {len(live_rows)} live vectors")
+
+
+class LocalVectorStore(VectorStore):
+    """File-backed collections searched with NumPy brute force or a FAISS index.
+
+    ``backend="numpy"`` scans the memory-mapped vectors with one matrix-vector
+    product, which is exact and fastest for small tenants. ``backend="faiss"``
+    keeps an in-memory index per collection, built from the vector file when
+    the collection is first opened in a process: ``flat`` (exact), ``ivf``
+    (trained once the collection has ``faiss_ivf_nlist * 39`` vectors, exact
+    until then) or ``hnsw``. ``vector_quantization`` swaps in the int8 (SQ8)
+    or PQ variant of that index; PQ starts once ``pq_train_min_vectors`` are
+    stored.
+    """
+
+    def __init__(self, path: str, backend: str = "numpy", index_type: str = "flat"):
+        if backend == "faiss" and faiss is None:
+            raise RuntimeError("vector_db_type='faiss' requires the faiss-cpu package")
+        if index_type not in ("flat", "ivf", "hnsw"):
+            raise ValueError(f"Unknown vector_index_type: {index_type}")
+        super().__init__()
+        self.backend = backend
+        self.index_type = index_type
+        self.path = os.path.join(path, backend)
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.path, "chunks.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS collections (user_id INTEGER PRIMARY KEY, dim INTEGER NOT NULL, "
+            "generation INTEGER NOT NULL DEFAULT 0, epoch INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(collections)")}
+        for column in ("generation", "epoch"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE collections ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "user_id INTEGER NOT NULL, chunk_id TEXT NOT NULL, row INTEGER NOT NULL, document_id INTEGER, "
+            "text TEXT, metadata TEXT, PRIMARY KEY (user_id, chunk_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_chunks_user_row ON chunks (user_id, row)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_chunks_user_document ON chunks (user_id, document_id)")
+        self._conn.commit()
+
+    def execute(self, sql: str, params=(), commit: bool = False) -> List[tuple]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            if commit:
+                self._conn.commit()
+            return rows
+
+    def executemany(self, sql: str, rows):
+        with self._lock:
+            self._conn.executemany(sql, rows)
+            self._conn.commit()
+
+    def _open_collection(self, user_id: int, create: bool) -> Optional[LocalCollection]:
+        # A collection's files only appear with its first vectors; creating it is just opening a handle
+        if not create and not self.execute("SELECT 1 FROM collections WHERE user_id = ?", (user_id,)):
+            return None
+        collection = LocalCollection(self, user_id)
+        collection._update_index()
+        return collection
+
+    def new_quantizer(self, dim: int):
+        """Code-file quantizer for the NumPy backend (FAISS quantizes inside its index)"""
+        if self.backend != "numpy":
+            return None
+        return create_quantizer(settings.vector_quantization, dim, settings.pq_subquantizers)
+
+    def _index_kind(self, rows: int):
+        """(structure, quantization) the FAISS index should have at this collection size"""
+        structure = self.index_type
+        if structure == "ivf" and rows < settings.faiss_ivf_nlist * 39:
+            structure = "flat"
+        quantization = settings.vector_quantization.lower()
+        if quantization == "pq" and rows < settings.pq_train_min_vectors:
+            quantization = "none"
+        return structure, quantization
+
+    def update_index(self, index, kind, vectors: Optional[np.ndarray], indexed_rows: int):
+        """Bring a collection's FAISS index up to date with its vector file; returns (index, kind, rows indexed)"""
+        if self.backend != "faiss" or vectors is None:
+            return None, None, 0
+        rows, dim = vectors.shape
+        wanted = self._index_kind(rows)
+        if index is None or kind != wanted:
+            index, kind, indexed_rows = self._new_index(dim, wanted, vectors), wanted, 0
+        for start in range(indexed_rows, rows, 65536):
+            index.add(np.ascontiguousarray(vectors[start:min(rows, start + 65536)]))
+        return index, kind, rows
+
+    def _new_index(self, dim: int, kind, vectors: np.ndarray):
+        structure, quantization = kind
+        ip = faiss.METRIC_INNER_PRODUCT
+        sq8 = faiss.ScalarQuantizer.QT_8bit
+        pq_m = pq_subquantizer_count(dim, settings.pq_subquantizers)
+        if structure == "hnsw":
+            if quantization == "int8":
+                index = faiss.IndexHNSWSQ(dim, sq8, settings.faiss_hnsw_m, ip)
+            elif quantization == "pq":
+                # L2 on normalized vectors ranks like inner product; candidates are re-scored anyway
+                index = faiss.IndexHNSWPQ(dim, pq_m, settings.faiss_hnsw_m)
+            else:
+                index = faiss.IndexHNSWFlat(dim, settings.faiss_hnsw_m, ip)
+            index.hnsw.efSearch = settings.faiss_hnsw_ef_search
+        elif structure == "ivf":
+            coarse = faiss.IndexFlatIP(dim)
+            if quantization == "int8":
+                index = faiss.IndexIVFScalarQuantizer(coarse, dim, settings.faiss_ivf_nlist, sq8, ip)
+            elif quantization == "pq":
+                index = faiss.IndexIVFPQ(coarse, dim, settings.faiss_ivf_nlist, pq_m, 8, ip)
+            else:
+                index = faiss.IndexIVFFlat(coarse, dim, settings.faiss_ivf_nlist, ip)
+            index.nprobe = settings.faiss_ivf_nprobe
+        elif quantization == "int8":
+            index = faiss.IndexScalarQuantizer(dim, sq8, ip)
+        elif quantization == "pq":
+            index = faiss.IndexPQ(dim, pq_m, 8, ip)
+        else:
+            index = faiss.IndexFlatIP(dim)
+
+        if not index.is_trained:
+            rows = len(vectors)
+            sample = np.sort(np.random.default_rng(0).choice(rows, min(rows, 65536), replace=False))
+            index.train(np.ascontiguousarray(vectors[sample]))
+        return index
+
+    def heartbeat(self):
+        self.execute("SELECT 1")
+
+    def close(self):
+        super().close()
+        with self._lock:
+            self._conn.close()
+
+
+def create_vector_store() -> VectorStore:
+    """Build the vector store selected by ``settings.vector_db_type``"""
+    backend = settings.vector_db_type.lower()
+    if backend == "chromadb":
+        return ChromaVectorStore(
+            settings.vector_store_path,
+            settings.vector_collection_layout.lower(),
+            settings.vector_shard_count
+        )
+    if settings.vector_collection_layout.lower() != "per_user":
+        raise ValueError("vector_collection_layout='sharded' is only supported with vector_db_type='chromadb'")
+    if backend in ("faiss", "numpy"):
+        store = LocalVectorStore(settings.vector_store_path, backend, settings.vector_index_type.lower())
+        logger.info(f"✅ Vector store: {backend}" + (f" ({store.index_type})" if backend == "faiss" else ""))
+        return store
+    raise ValueError(f"Unknown vector_db_type: {settings.vector_db_type}")
+
+
+_vector_store: Optional[VectorStore] = None
+_vector_store_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    """Process-wide vector store, shared by RAGService and the document endpoints"""
+    global _vector_store
+    with _vector_store_lock:
+        if _vector_store is None:
+            _vector_store = create_vector_store()
+        return _vector_store
+
+
+def close_vector_store():
+    global _vector_store
+    with _vector_store_lock:
+        if _vector_store is not None:
+            _vector_store.close()
+            _vector_store = None
@@ -5,6 +5,8 @@ from app.core.config import settings
 from app.core.security import verify_token, create_credentials_exception
 from app.db.database import get_db
 from app.models.models import User
+from app.services.model_loader import model_loader
+from app.services.rag_service import RAGService
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 
@@ -32,3 +34,7 @@ async def get_current_active_user(
             detail="Inactive user"
         )
     return current_user
+
+async def get_rag_service() -> RAGService:
+    '''Shared RAG service, loaded once per worker'''
+    return await model_loader.load_model()
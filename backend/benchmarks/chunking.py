@@ -0,0 +1,141 @@
+"""
+Retrieval quality vs. chunk count for the chunking strategies
+Run from backend/: python -m benchmarks.chunking [--files a.txt b.txt] [--queries 300] [--model NAME]
+
+Chunks a corpus with every strategy and reports chunk count, average chunk
+tokens, chunking throughput and recall@k, plus the context tokens that k
+chunks cost in a prompt. Queries are sampled sentences with half of their
+words dropped; a query is a hit when a retrieved chunk contains the whole
+sentence. Retrieval is BM25 by default, or dense vectors with --model
+(needs sentence-transformers). Without --files a synthetic document with
+headings and page breaks is generated.
+"""
+
+import argparse
+import random
+import re
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.chunking import CHUNK_STRATEGIES, PAGE_BREAK, create_splitter, split_sentences
+from app.services.keyword_index import _UserIndex, tokenize
+from app.services.tokens import count_tokens
+
+WORDS = (
+    "invoice payment contract vendor service delivery schedule warranty claim policy account balance report "
+    "quarter revenue margin forecast budget audit compliance security incident access network server backup "
+    "storage latency release feature customer support ticket escalation priority region market product price"
+).split()
+
+
+def synthetic_document(sections: int, seed: int) -> str:
+    """Pages of headed sections with paragraphs of short sentences"""
+    rng = random.Random(seed)
+    pages, page = [], []
+    for section in range(1, sections + 1):
+        page.append(f"{section}. {rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} overview")
+        for _ in range(rng.randint(1, 4)):
+            sentences = []
+            for _ in range(rng.randint(2, 7)):
+                words = [rng.choice(WORDS) for _ in range(rng.randint(6, 22))]
+                words.insert(rng.randrange(len(words)), f"ref-{rng.randint(1000, 9999)}")
+                sentences.append(" ".join(words).capitalize() + ".")
+            page.append(" ".join(sentences))
+        if rng.random() < 0.3:
+            pages.append("\n\n".join(page))
+            page = []
+    pages.append("\n\n".join(page))
+    return PAGE_BREAK.join(pages)
+
+
+def sample_queries(text: str, count: int, seed: int):
+    rng = random.Random(seed)
+    candidates = [
+        sentence.strip() for sentence in split_sentences(text.replace(PAGE_BREAK, "\n\n"))
+        if 8 <= len(sentence.split()) <= 40 and "\n" not in sentence.strip()
+    ]
+    targets = rng.sample(candidates, min(count, len(candidates)))
+    queries = []
+    for sentence in targets:
+        words = sentence.split()
+        kept = sorted(rng.sample(range(len(words)), max(3, len(words) // 2)))
+        queries.append((" ".join(words[i] for i in kept), sentence))
+    return queries
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text)
+
+
+class KeywordRetriever:
+    def __init__(self, chunks):
+        self.index = _UserIndex()
+        for i, chunk in enumerate(chunks):
+            self.index.add(str(i), chunk)
+
+    def search(self, query: str, k: int):
+        return [int(chunk_id) for chunk_id, _ in self.index.search(tokenize(query), k, settings.bm25_k1, settings.bm25_b)]
+
+
+class DenseRetriever:
+    def __init__(self, model, chunks):
+        self.model = model
+        self.vectors = model.encode(chunks, batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+
+    def search(self, query: str, k: int):
+        query_vector = self.model.encode([query], normalize_embeddings=True, convert_to_numpy=True)[0]
+        return np.argsort(-(self.vectors @ query_vector))[:k].tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", nargs="*", help="Text files to use as the corpus (form feeds mark pages)")
+    parser.add_argument("--sections", type=int, default=400, help="Sections in the synthetic document")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--model", help="sentence-transformers model for dense retrieval instead of BM25")
+    parser.add_argument("--strategies", nargs="*", default=list(CHUNK_STRATEGIES), choices=CHUNK_STRATEGIES)
+    args = parser.parse_args()
+
+    if args.files:
+        documents = []
+        for path in args.files:
+            with open(path, encoding="utf-8", errors="replace") as file:
+                documents.append(file.read())
+    else:
+        documents = [synthetic_document(args.sections, seed=0)]
+    queries = [query for i, document in enumerate(documents) for query in sample_queries(document, args.queries, seed=i)]
+    model = None
+    if args.model:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.model)
+
+    size = sum(len(document) for document in documents)
+    print(f"📊 {len(documents)} documents, {size / 1e6:.2f} MB, {len(queries)} queries, "
+          f"{'dense: ' + args.model if model else 'BM25'} recall@{args.k}")
+    print(f"{'strategy':<10} {'chunks':>7} {'avg tok':>8} {'MB/s':>7} {'recall':>7} {'ctx tok':>8}")
+    for strategy in args.strategies:
+        splitter = create_splitter(strategy)
+        started = time.perf_counter()
+        chunks = [chunk for document in documents for chunk in splitter.split_text(document)]
+        seconds = time.perf_counter() - started
+        tokens = [count_tokens(chunk) for chunk in chunks]
+
+        retriever = DenseRetriever(model, chunks) if model else KeywordRetriever(chunks)
+        normalized = [normalize(chunk) for chunk in chunks]
+        hits, context_tokens = 0, []
+        for query, sentence in queries:
+            retrieved = retriever.search(query, args.k)
+            target = normalize(sentence)
+            hits += any(target in normalized[i] for i in retrieved)
+            context_tokens.append(sum(tokens[i] for i in retrieved))
+        print(
+            f"{strategy:<10} {len(chunks):>7} {np.mean(tokens):>8.0f} {size / 1e6 / seconds:>7.1f} "
+            f"{hits / len(queries):>7.3f} {np.mean(context_tokens):>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
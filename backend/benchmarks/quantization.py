@@ -0,0 +1,91 @@
+"""
+Recall@k vs. memory for quantized vector storage
+Run from backend/: python -m benchmarks.quantization [--vectors 50000 --dim 384]
+
+Compares the full-precision path against int8 and PQ codes (NumPy and, when
+faiss-cpu is installed, FAISS) with and without float re-scoring. Recall is
+measured against exact float inner-product search over the same vectors.
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.vector_store import LocalVectorStore, faiss
+
+
+def synthetic_embeddings(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Normalized vectors drawn around topic centers, closer to real embeddings than pure noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_collection(path: str, backend: str, index_type: str, vectors: np.ndarray):
+    store = LocalVectorStore(path, backend, index_type)
+    collection = store.create_collection(1)
+    for start in range(0, len(vectors), 5000):
+        batch = vectors[start:start + 5000]
+        ids = [f"doc_0_chunk_{i}" for i in range(start, start + len(batch))]
+        collection.add(ids=ids, embeddings=batch, metadatas=[{"document_id": 0}] * len(batch), documents=[""] * len(batch))
+    return store, collection
+
+
+def evaluate(collection, queries: np.ndarray, truth: np.ndarray, k: int):
+    hits, latencies = 0, []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        rows, _ = collection._search(query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(set(rows.tolist()) & set(expected.tolist()))
+    return hits / (len(queries) * k), statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--embeddings", help="Optional .npy of real (normalized) embeddings to use instead")
+    parser.add_argument("--index-type", default="flat", choices=["flat", "ivf", "hnsw"])
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = np.load(args.embeddings).astype(np.float32)
+    else:
+        vectors = synthetic_embeddings(args.vectors, args.dim, args.clusters, seed=0)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+
+    backends = ["numpy"] + (["faiss"] if faiss is not None else [])
+    print(f"📊 {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, recall@{args.k}")
+    print(f"{'backend':<8} {'quant':<6} {'rescore':>7} {'recall':>8} {'MB':>9} {'B/vec':>7} {'p50 ms':>8}")
+    settings.pq_train_min_vectors = min(settings.pq_train_min_vectors, len(vectors))
+    for backend in backends:
+        for quantization in ("none", "int8", "pq"):
+            settings.vector_quantization = quantization
+            with tempfile.TemporaryDirectory() as path:
+                store, collection = build_collection(path, backend, args.index_type, vectors)
+                memory = collection.memory_stats()["scanned_bytes"]
+                for factor in ((1,) if quantization == "none" else (1, 4, 10)):
+                    settings.quantization_rescore_factor = factor
+                    recall, p50 = evaluate(collection, queries, truth, args.k)
+                    print(
+                        f"{backend:<8} {quantization:<6} {factor if quantization != 'none' else '-':>7} "
+                        f"{recall:>8.3f} {memory / 1e6:>9.1f} {memory / len(vectors):>7.0f} {p50:>8.2f}"
+                    )
+                store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Per-user vs. sharded ChromaDB collection layout at many tenants
+Run from backend/: python -m benchmarks.tenancy [--tenants 10000 --chunks 10 --shards 16]
+
+Builds both layouts through ChromaVectorStore in temporary directories and
+reports ingest time, collection count, disk use, open file descriptors, peak
+RSS, and p50/p95 query latency for cold (freshly opened store) and warm
+handles on a sample of tenants.
+"""
+
+import argparse
+import os
+import resource
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.vector_store import ChromaVectorStore
+
+
+def disk_usage(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def open_fds() -> int:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return -1
+
+
+def reset_chroma_cache():
+    """Make the next PersistentClient start cold instead of reusing the in-process system"""
+    try:
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+    except (ImportError, AttributeError):
+        pass
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(0.95 * (len(samples) - 1))]
+
+
+def run_queries(store, tenants, queries):
+    latencies = []
+    for user_id, query in zip(tenants, queries):
+        started = time.perf_counter()
+        collection = store.get_collection(user_id)
+        collection.query(query_embeddings=[query.tolist()], n_results=5)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return percentiles(latencies)
+
+
+def bench_layout(layout: str, args, vectors: np.ndarray):
+    settings.collection_cache_max_handles = args.tenants + 1
+    with tempfile.TemporaryDirectory() as path:
+        store = ChromaVectorStore(path, layout, args.shards)
+        started = time.perf_counter()
+        for user_id in range(1, args.tenants + 1):
+            start = (user_id - 1) * args.chunks
+            collection = store.create_collection(user_id)
+            collection.add(
+                ids=[f"doc_{user_id}_chunk_{i}" for i in range(args.chunks)],
+                embeddings=vectors[start:start + args.chunks].tolist(),
+                metadatas=[{"document_id": user_id, "chunk_index": i} for i in range(args.chunks)],
+                documents=[f"tenant {user_id} chunk {i}" for i in range(args.chunks)]
+            )
+        ingest_seconds = time.perf_counter() - started
+        collections = len(store.client.list_collections())
+
+        rng = np.random.default_rng(1)
+        sample = rng.choice(np.arange(1, args.tenants + 1), args.sample, replace=False).tolist()
+        queries = [vectors[(user_id - 1) * args.chunks] for user_id in sample]
+
+        store.close()
+        reset_chroma_cache()
+        store = ChromaVectorStore(path, layout, args.shards)
+        cold = run_queries(store, sample, queries)
+        warm = run_queries(store, sample, queries)
+        fds = open_fds()
+        size = disk_usage(path)
+        store.close()
+        reset_chroma_cache()
+
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{layout:<9} {collections:>11} {ingest_seconds:>9.1f} {size / 1e6:>9.1f} {fds:>5} {rss_mb:>8.0f} "
+        f"{cold[0]:>8.2f} {cold[1]:>8.2f} {warm[0]:>8.2f} {warm[1]:>8.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=10_000)
+    parser.add_argument("--chunks", type=int, default=10, help="Chunks per tenant")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--shards", type=int, default=settings.vector_shard_count)
+    parser.add_argument("--sample", type=int, default=200, help="Tenants queried for latency")
+    parser.add_argument("--layout", choices=["per_user", "sharded"], help="Run one layout only")
+    args = parser.parse_args()
+    args.sample = min(args.sample, args.tenants)
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.tenants * args.chunks, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    print(f"📊 {args.tenants} tenants x {args.chunks} chunks ({args.dim} dims), {args.shards} shards")
+    print("   (peak RSS is cumulative for the process; run one --layout at a time to compare it)")
+    print(
+        f"{'layout':<9} {'collections':>11} {'ingest s':>9} {'disk MB':>9} {'fds':>5} {'RSS MB':>8} "
+        f"{'cold p50':>8} {'cold p95':>8} {'warm p50':>8} {'warm p95':>8}"
+    )
+    for layout in ([args.layout] if args.layout else ["per_user", "sharded"]):
+        bench_layout(layout, args, vectors)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ Run this to set up the database schema
 """
 
 from app.models.models import Base
-from app.db.database import engine, SessionLocal
+from app.db.database import engine, SessionLocal, upgrade_schema
 from app.core.config import settings
 from sqlalchemy import text
 
@@ -15,6 +15,7 @@ def init_db():
 
     try:
         Base.metadata.create_all(bind=engine)
+        upgrade_schema()
         print("✅ Database tables created successfully!")
         print("🗃️ Tables created:")
         print("  - users (authentication)")
@@ -23,6 +24,7 @@ def init_db():
         print("  - conversations (chat sessions)")
         print("  - messages (chat history)")
         print("  - vector_collections (vector store tracking)")
+        print("  - ingestion_jobs (background processing queue)")
     except Exception as e:
         print(f"❌ Database initialization failed: {e}")
         raise
@@ -1,19 +1,43 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 import os
-import asyncio
 from sqlalchemy import text
 from typing import List
 
 from app.core.config import settings
-from app.api.endpoints import auth, chat, documents
-from app.db.database import engine, SessionLocal
+from app.api.endpoints import auth, chat, documents, status
+from app.db.database import engine, SessionLocal, upgrade_schema
 from app.models import models
+from app.services.chunking import validate_chunk_strategies
+from app.services.executors import cpu_executors
+from app.services.ingestion_queue import ingestion_queue
+from app.services.llm_client import get_llm_client
+from app.services.model_loader import model_loader
+
+# Fail fast on chunking settings that would otherwise fail every ingestion job
+validate_chunk_strategies()
 
 # Create database tables if they do not exist
 models.Base.metadata.create_all(bind=engine)
+upgrade_schema()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the shared RAG service once per worker before serving traffic
+    try:
+        await model_loader.load_model()
+    except HTTPException:
+        # Keep serving; requests needing the model will retry the load
+        pass
+    await ingestion_queue.start()
+    yield
+    await ingestion_queue.stop()
+    model_loader.shutdown()
+    cpu_executors.shutdown()
+    get_llm_client().shutdown()
 
 app = FastAPI(
     title="AI RAG Chatbot API",
@@ -23,6 +47,7 @@ app = FastAPI(
     ),
     version="2.0.0",
     debug=settings.debug,
+    lifespan=lifespan,
 )
 
 # CORS middleware to allow cross-origin calls from configured origins
@@ -46,42 +71,7 @@ if os.path.exists(settings.upload_path):
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["🔐 Authentication"])
 app.include_router(documents.router, prefix="/api/v1/documents", tags=["📄 Document Management"])
 app.include_router(chat.router, prefix="/api/v1/chat", tags=["💬 RAG Chat & History"])
-
-# Lazy Model Loader Class
-class ModelLoader:
-    def __init__(self):
-        self.model = None
-        self.loading = False
-        self.loaded = False
-
-    async def load_model(self):
-        if self.loaded:
-            return self.model
-        if self.loading:
-            while self.loading:
-                await asyncio.sleep(0.1)
-            return self.model
-        self.loading = True
-        try:
-            print("🤖 Loading AI model...")
-            # Replace the following sleep with your actual model loading logic
-            await asyncio.sleep(2)
-
-            # Example model loading (replace with your actual model code)
-            # from sentence_transformers import SentenceTransformer
-            # self.model = SentenceTransformer('all-MiniLM-L6-v2')
-            
-            self.model = "AI Model Loaded"  # Placeholder for actual model
-            self.loaded = True
-            print("✅ AI model loaded successfully!")
-            return self.model
-        except Exception as e:
-            print(f"❌ Failed to load model: {e}")
-            raise HTTPException(status_code=500, detail=f"Model loading failed: {str(e)}")
-        finally:
-            self.loading = False
-
-model_loader = ModelLoader()
+app.include_router(status.router, prefix="/api", tags=["🤖 Model Status"])
 
 @app.get("/")
 async def root():
@@ -112,14 +102,19 @@ async def health_check():
     except Exception as e:
         db_status = f"❌ Error: {str(e)}"
 
-    gemini_status = "✅ Configured" if settings.gemini_api_key else "⚠️ No API key"
+    if settings.llm_backend == "fake":
+        gemini_status = "🧪 Fake LLM backend"
+    else:
+        gemini_status = "✅ Configured" if settings.gemini_api_key else "⚠️ No API key"
 
-    try:
-        import chromadb
-        chroma_client = chromadb.PersistentClient(path=settings.vector_store_path)
-        vector_status = "✅ ChromaDB Connected"
-    except Exception as e:
-        vector_status = f"❌ ChromaDB Error: {str(e)}"
+    if model_loader.loaded:
+        try:
+            model_loader.rag_service.vector_store.heartbeat()
+            vector_status = f"✅ {settings.vector_db_type} Connected"
+        except Exception as e:
+            vector_status = f"❌ {settings.vector_db_type} Error: {str(e)}"
+    else:
+        vector_status = "⏳ Waiting for model load"
 
     return {
         "status": "healthy",
@@ -128,6 +123,7 @@ async def health_check():
             "database": db_status,
             "gemini_api": gemini_status,
             "vector_db": vector_status,
+            "model": model_loader.get_status()["status"],
             "upload_dir": f"✅ {settings.upload_path}",
             "vector_store": f"✅ {settings.vector_store_path}",
         },
@@ -150,25 +146,6 @@ async def admin_info():
         },
     }
 
-# Model status endpoint
-@app.get("/api/model/status")
-async def get_model_status():
-    return {
-        "loaded": model_loader.loaded,
-        "loading": model_loader.loading,
-        "status": "loaded" if model_loader.loaded else "loading" if model_loader.loading else "not_loaded"
-    }
-
-# Preload model endpoint
-@app.post("/api/model/preload")
-async def preload_model(background_tasks: BackgroundTasks):
-    if model_loader.loaded:
-        return {"status": "already_loaded"}
-    if model_loader.loading:
-        return {"status": "loading"}
-    background_tasks.add_task(model_loader.load_model)
-    return {"status": "loading_started"}
-
 # Include legacy item routes (optional)
 from fastapi import APIRouter
 from pydantic import BaseModel
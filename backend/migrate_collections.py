@@ -0,0 +1,89 @@
+"""
+Migrate ChromaDB vectors from per-user collections to the sharded layout
+Run from backend/: python migrate_collections.py [--shards 16] [--delete-source] [--dry-run]
+
+Copies every ``user_<id>_documents`` collection into ``shard_<n>_documents``
+(n = user_id % shards) with ``user_id`` added to each record's metadata, then
+verifies the per-user counts. Set VECTOR_COLLECTION_LAYOUT=sharded and
+VECTOR_SHARD_COUNT to the same shard count afterwards.
+"""
+
+import argparse
+import re
+
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+
+from app.core.config import settings
+from app.services.vector_store import TenantCollection, shard_collection_name, shard_for_user
+
+USER_COLLECTION = re.compile(r"^user_(\d+)_documents$")
+PAGE_SIZE = 1000
+
+
+def migrate_user(client, source, user_id: int, shard_count: int, dry_run: bool) -> int:
+    shard = shard_for_user(user_id, shard_count)
+    target = TenantCollection(
+        client.get_or_create_collection(name=shard_collection_name(shard), metadata={"shard": shard}),
+        user_id
+    )
+    copied = 0
+    offset = 0
+    while True:
+        page = source.get(limit=PAGE_SIZE, offset=offset, include=["embeddings", "documents", "metadatas"])
+        if not page["ids"]:
+            break
+        if not dry_run:
+            target.add(
+                ids=page["ids"],
+                embeddings=page["embeddings"],
+                metadatas=page["metadatas"],
+                documents=page["documents"]
+            )
+        copied += len(page["ids"])
+        offset += PAGE_SIZE
+
+    if not dry_run and target.count() != source.count():
+        raise RuntimeError(f"Count mismatch for user {user_id}: {target.count()} in shard, {source.count()} in source")
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=settings.vector_shard_count)
+    parser.add_argument("--delete-source", action="store_true", help="Drop per-user collections once verified")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be copied")
+    args = parser.parse_args()
+
+    print("🔄 Migrating per-user collections to the sharded layout...")
+    print(f"📍 Vector store: {settings.vector_store_path} ({args.shards} shards)")
+    client = chromadb.PersistentClient(
+        path=settings.vector_store_path,
+        settings=ChromaSettings(anonymized_telemetry=False)
+    )
+
+    users, chunks, failed = 0, 0, 0
+    for collection in client.list_collections():
+        match = USER_COLLECTION.match(collection.name)
+        if not match:
+            continue
+        user_id = int(match.group(1))
+        try:
+            copied = migrate_user(client, collection, user_id, args.shards, args.dry_run)
+        except Exception as e:
+            failed += 1
+            print(f"❌ {collection.name}: {e}")
+            continue
+        users += 1
+        chunks += copied
+        print(f"✅ {collection.name} -> {shard_collection_name(shard_for_user(user_id, args.shards))}: {copied} chunks")
+        if args.delete_source and not args.dry_run:
+            client.delete_collection(collection.name)
+
+    print(f"📊 {users} users, {chunks} chunks {'would be ' if args.dry_run else ''}migrated, {failed} failed")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
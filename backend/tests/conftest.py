@@ -0,0 +1,19 @@
+import os
+
+# The default frontend_url in Settings is a tuple; give the settings a plain value
+os.environ.setdefault("FRONTEND_URL", "http://localhost:3000")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.models import Base
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Sessions on a throwaway SQLite database with the app's tables"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
@@ -0,0 +1,99 @@
+import pytest
+
+from app.core.config import settings
+from app.services.chunking import (
+    PAGE_BREAK, IncrementalSplitter, RecursiveSplitter, StructureSplitter, SentenceSplitter,
+    create_splitter, split_sentences, validate_chunk_strategies
+)
+
+TEXT = "\n\n".join(
+    " ".join(f"Paragraph {p} sentence {s} talks about invoices and contracts." for s in range(6))
+    for p in range(30)
+)
+
+
+def feed_all(splitter, pieces, separator="\n"):
+    incremental = IncrementalSplitter(splitter.split_text, separator=separator)
+    chunks = []
+    for piece in pieces:
+        chunks.extend(incremental.feed(piece))
+    chunks.extend(incremental.finish())
+    return chunks
+
+
+@pytest.mark.parametrize("pieces", [1, 3, 30])
+def test_incremental_matches_whole_text(pieces):
+    splitter = RecursiveSplitter(300, 50)
+    paragraphs = TEXT.split("\n\n")
+    step = max(1, len(paragraphs) // pieces)
+    parts = ["\n\n".join(paragraphs[i:i + step]) for i in range(0, len(paragraphs), step)]
+
+    chunks = feed_all(splitter, parts, separator="\n\n")
+
+    assert chunks == splitter.split_text(TEXT)
+
+
+def test_incremental_emits_before_finish():
+    incremental = IncrementalSplitter(RecursiveSplitter(200, 0).split_text)
+    emitted = []
+    for paragraph in TEXT.split("\n\n"):
+        emitted.extend(incremental.feed(paragraph))
+    assert emitted
+    assert incremental.finish()
+
+
+def test_incremental_finish_on_blank_buffer():
+    incremental = IncrementalSplitter(RecursiveSplitter(200, 0).split_text)
+    incremental.feed("   ")
+    assert incremental.finish() == []
+
+
+def test_incremental_keeps_page_breaks_for_structure_splitter():
+    splitter = StructureSplitter(SentenceSplitter(1000, 100), min_size=0)
+    pages = ["First page text.", "Second page text."]
+
+    chunks = feed_all(splitter, pages, separator=splitter.segment_separator)
+
+    assert chunks == ["First page text.", "Second page text."]
+
+
+def test_recursive_chunks_respect_size():
+    chunks = RecursiveSplitter(300, 50).split_text(TEXT)
+    assert all(len(chunk) <= 300 for chunk in chunks)
+
+
+def test_split_sentences_is_lossless_and_skips_abbreviations():
+    text = "Dr. Smith signed it, e.g. on Monday. Payment follows! Is it due? Yes."
+    sentences = split_sentences(text)
+    assert "".join(sentences) == text
+    assert sentences[0] == "Dr. Smith signed it, e.g. on Monday. "
+
+
+def test_short_section_folds_into_next():
+    splitter = StructureSplitter(SentenceSplitter(1000, 100), min_size=200)
+    body = " ".join(["This is a fairly long sentence about invoices."] * 40)
+    text = f"# Intro\nShort intro.\n# Body\n{body}"
+
+    chunks = splitter.split_text(text)
+
+    assert chunks[0].startswith("# Intro\nShort intro.\n# Body\n")
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+
+
+def test_sections_split_at_headings_and_pages():
+    text = f"Intro\n# One\nfirst{PAGE_BREAK}second page\n2. Second Part\nmore"
+    assert StructureSplitter.sections(text) == ["Intro\n", "# One\nfirst", "second page\n", "2. Second Part\nmore"]
+
+
+def test_unknown_strategy_fails_validation(monkeypatch):
+    monkeypatch.setattr(settings, "chunk_strategies", "pdf:structure,txt:paragraphs")
+    with pytest.raises(ValueError):
+        validate_chunk_strategies()
+
+
+def test_strategy_lookup_by_file_type(monkeypatch):
+    monkeypatch.setattr(settings, "chunk_strategies", "pdf:structure")
+    monkeypatch.setattr(settings, "chunk_default_strategy", "recursive")
+    assert settings.chunk_strategy_for("PDF") == "structure"
+    assert settings.chunk_strategy_for("txt") == "recursive"
+    assert isinstance(create_splitter("structure"), StructureSplitter)
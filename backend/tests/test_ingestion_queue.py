@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models.models import Document, IngestionJob, User
+from app.services import ingestion_queue as ingestion_queue_module
+from app.services.ingestion_queue import IngestionQueue
+
+
+@pytest.fixture
+def db(session_factory):
+    with session_factory() as session:
+        yield session
+
+
+def add_user(db, user_id):
+    db.add(User(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com", hashed_password="x"))
+    db.commit()
+
+
+def add_job(db, user_id, priority=0, status="queued", **fields):
+    document = Document(
+        user_id=user_id, filename="f.txt", original_filename="f.txt", file_path="/tmp/f.txt",
+        file_size=1, file_type="txt", document_type="text", processing_status="pending"
+    )
+    db.add(document)
+    db.flush()
+    job = IngestionJob(
+        document_id=document.id, user_id=user_id, status=status, priority=priority, attempts=0,
+        next_run_at=datetime.utcnow() - timedelta(seconds=1), **fields
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def test_claim_marks_job_running(db, session_factory):
+    add_user(db, 1)
+    job = add_job(db, 1)
+
+    claimed = IngestionQueue()._claim_next(session_factory())
+
+    assert claimed.id == job.id
+    assert claimed.status == "running"
+    assert claimed.attempts == 1
+    assert claimed.locked_by is not None
+
+
+def test_claim_prefers_priority_then_age(db, session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "ingestion_per_user_concurrency", 5)
+    add_user(db, 1)
+    first = add_job(db, 1)
+    urgent = add_job(db, 1, priority=10)
+    queue = IngestionQueue()
+
+    assert queue._claim_next(session_factory()).id == urgent.id
+    assert queue._claim_next(session_factory()).id == first.id
+
+
+def test_claim_skips_users_at_their_limit(db, session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "ingestion_per_user_concurrency", 1)
+    add_user(db, 1)
+    add_job(db, 1, status="running", locked_at=datetime.utcnow())
+    add_job(db, 1)
+
+    assert IngestionQueue()._claim_next(session_factory()) is None
+
+
+def test_large_backlog_does_not_starve_other_users(db, session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "ingestion_per_user_concurrency", 1)
+    add_user(db, 1)
+    add_user(db, 2)
+    for _ in range(60):
+        add_job(db, 1)
+    other = add_job(db, 2)
+    workers = [IngestionQueue(), IngestionQueue()]
+
+    claims = [worker._claim_next(session_factory()) for worker in workers]
+
+    assert sorted(job.user_id for job in claims) == [1, 2]
+    assert other.id in {job.id for job in claims}
+    assert IngestionQueue()._claim_next(session_factory()) is None
+
+
+def test_claim_rechecks_running_count(db, session_factory, monkeypatch):
+    """A claim made by another worker after the candidates were read still counts"""
+    monkeypatch.setattr(settings, "ingestion_per_user_concurrency", 1)
+    add_user(db, 1)
+    add_job(db, 1)
+    add_job(db, 1)
+    queue = IngestionQueue()
+    original = IngestionQueue._running_count
+
+    def running_count(session, user_id):
+        # Another worker claims this user's other job in between
+        with session_factory() as other:
+            job = other.query(IngestionJob).filter(IngestionJob.status == "queued").order_by(IngestionJob.id.desc()).first()
+            job.status = "running"
+            other.commit()
+        return original(session, user_id)
+
+    monkeypatch.setattr(IngestionQueue, "_running_count", staticmethod(running_count))
+
+    assert queue._claim_next(session_factory()) is None
+    assert db.query(IngestionJob).filter(IngestionJob.status == "running").count() == 1
+
+
+def test_expired_leases_are_requeued(db, session_factory, monkeypatch):
+    add_user(db, 1)
+    stale = add_job(db, 1, status="running", locked_by="gone:1",
+                    locked_at=datetime.utcnow() - timedelta(seconds=settings.ingestion_lease_seconds + 60))
+    fresh = add_job(db, 1, status="running", locked_by="alive:1", locked_at=datetime.utcnow())
+
+    IngestionQueue()._requeue_expired(session_factory())
+
+    db.expire_all()
+    assert db.get(IngestionJob, stale.id).status == "queued"
+    assert db.get(IngestionJob, stale.id).locked_by is None
+    assert db.get(IngestionJob, fresh.id).status == "running"
+
+
+def test_heartbeat_renews_lease_and_stores_progress(db, session_factory, monkeypatch):
+    monkeypatch.setattr(ingestion_queue_module, "SessionLocal", session_factory)
+    monkeypatch.setattr(settings, "ingestion_heartbeat_seconds", 0.0)
+    add_user(db, 1)
+    queue = IngestionQueue()
+    locked_at = datetime.utcnow() - timedelta(seconds=600)
+    job = add_job(db, 1, status="running", locked_by=queue.worker_id, locked_at=locked_at)
+
+    queue._heartbeat(job.id)(40.0)
+
+    db.expire_all()
+    renewed = db.get(IngestionJob, job.id)
+    assert renewed.locked_at > locked_at
+    assert renewed.progress == pytest.approx(0.4)
+
+
+def test_heartbeat_leaves_jobs_claimed_by_others(db, session_factory, monkeypatch):
+    monkeypatch.setattr(ingestion_queue_module, "SessionLocal", session_factory)
+    monkeypatch.setattr(settings, "ingestion_heartbeat_seconds", 0.0)
+    add_user(db, 1)
+    locked_at = datetime.utcnow() - timedelta(seconds=600)
+    job = add_job(db, 1, status="running", locked_by="other:1", locked_at=locked_at)
+
+    IngestionQueue()._heartbeat(job.id)(40.0)
+
+    db.expire_all()
+    assert db.get(IngestionJob, job.id).locked_at == locked_at
@@ -0,0 +1,93 @@
+import pytest
+
+from app.services.keyword_index import KeywordIndex, reciprocal_rank_fusion, tokenize
+
+
+@pytest.fixture
+def indexes(tmp_path):
+    """Two indexes on one SQLite file, standing in for two worker processes"""
+    path = str(tmp_path / "keyword_index.sqlite3")
+    first, second = KeywordIndex(path), KeywordIndex(path)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def ids(results):
+    return [result["id"] for result in results]
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    tokens = tokenize("What is the status of ABC-123 in v2.1?")
+    assert "abc-123" in tokens
+    assert {"abc", "123", "status"} <= set(tokens)
+    assert "the" not in tokens
+
+
+def test_search_ranks_by_bm25(indexes):
+    index, _ = indexes
+    index.add(1, ["a", "b"], ["invoice ABC-123 overdue", "weekly report"], [{"document_id": 1}] * 2)
+
+    results = index.search(1, "ABC-123")
+
+    assert ids(results) == ["a"]
+    assert results[0]["metadata"] == {"document_id": 1}
+
+
+def test_readd_replaces_previous_text(indexes):
+    index, _ = indexes
+    index.add(1, ["a"], ["alpha"], [{"document_id": 1}])
+    index.search(1, "alpha")
+    index.add(1, ["a"], ["gamma"], [{"document_id": 1}])
+
+    assert ids(index.search(1, "alpha")) == []
+    assert ids(index.search(1, "gamma")) == ["a"]
+
+
+def test_writes_by_another_index_are_seen(indexes):
+    first, second = indexes
+    first.add(1, ["a"], ["alpha invoice"], [{"document_id": 1}])
+    assert ids(second.search(1, "invoice")) == ["a"]
+
+    first.add(1, ["b"], ["beta invoice"], [{"document_id": 2}])
+    assert set(ids(second.search(1, "invoice"))) == {"a", "b"}
+
+    second.add(1, ["a"], ["gamma"], [{"document_id": 1}])
+    assert ids(first.search(1, "alpha")) == []
+    assert ids(first.search(1, "gamma")) == ["a"]
+
+    first.delete_document(1, 2)
+    assert ids(second.search(1, "beta")) == []
+
+
+def test_versions_stay_in_step(indexes):
+    first, second = indexes
+    first.add(1, ["a"], ["alpha"], [{"document_id": 1}])
+    second.search(1, "alpha")
+    first.search(1, "alpha")
+    second.add(1, ["b"], ["beta"], [{"document_id": 2}])
+    first.search(1, "beta")
+
+    assert first._version(1) == 2
+    assert first._loaded[1].version == second._loaded[1].version == 2
+
+
+def test_delete_without_rows_is_not_a_write(indexes):
+    index, _ = indexes
+    assert index.delete_document(1, 99) == 0
+    assert index._version(1) == 0
+
+
+def test_backfill_marker_is_shared(indexes):
+    first, second = indexes
+    assert not second.is_backfilled(1)
+
+    first.mark_backfilled(1)
+
+    assert second.is_backfilled(1)
+    assert not second.is_backfilled(2)
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    assert [chunk_id for chunk_id, _ in fused][:2] == ["b", "a"]
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.vector_store import LocalVectorStore
+
+DIM = 16
+
+
+@pytest.fixture(params=["none", "int8"])
+def stores(request, tmp_path, monkeypatch):
+    """Two stores on one directory, standing in for two worker processes"""
+    monkeypatch.setattr(settings, "vector_quantization", request.param)
+    first, second = LocalVectorStore(str(tmp_path), "numpy"), LocalVectorStore(str(tmp_path), "numpy")
+    yield first, second
+    first.close()
+    second.close()
+
+
+def vectors(count, seed=0):
+    rows = np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def add(collection, start, rows, document_id=1):
+    ids = [f"c{i}" for i in range(start, start + len(rows))]
+    collection.add(ids, rows, [{"document_id": document_id}] * len(rows), [f"text {i}" for i in range(start, start + len(rows))])
+    return ids
+
+
+def test_query_on_handle_opened_before_first_write(stores):
+    writer, reader = stores
+    handle = reader.create_collection(1)
+    assert handle.query([np.ones(DIM).tolist()], 3) == {
+        "ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]
+    }
+
+    rows = vectors(5)
+    add(writer.create_collection(1), 0, rows)
+
+    assert handle.query([rows[3].tolist()], 1)["documents"] == [["text 3"]]
+
+
+def test_rows_added_by_another_store_are_visible(stores):
+    writer, reader = stores
+    rows = vectors(50)
+    add(writer.create_collection(1), 0, rows[:10])
+    handle = reader.get_collection(1)
+    assert handle.count() == 10
+
+    add(writer.get_collection(1), 10, rows[10:])
+
+    assert handle.count() == 50
+    assert handle.query([rows[42].tolist()], 1)["documents"] == [["text 42"]]
+
+
+def test_compaction_by_another_store_keeps_texts_aligned(stores):
+    writer, reader = stores
+    rows = vectors(3000)
+    collection = writer.create_collection(1)
+    add(collection, 0, rows)
+    handle = reader.get_collection(1)
+    assert handle.query([rows[2500].tolist()], 1)["documents"] == [["text 2500"]]
+
+    # Deleting most rows compacts the vector file, renumbering the survivors
+    collection.delete([f"c{i}" for i in range(10, 2600)])
+
+    assert handle.count() == 410
+    assert handle.query([rows[2700].tolist()], 1)["documents"] == [["text 2700"]]
+    assert handle.query([rows[5].tolist()], 1)["documents"] == [["text 5"]]
+    stored = handle.get(ids=["c2800"], include=["embeddings"])["embeddings"][0]
+    assert np.allclose(stored, rows[2800], atol=1e-6)
+
+
+def test_writes_from_both_stores_interleave(stores):
+    first, second = stores
+    rows = vectors(20)
+    add(first.create_collection(1), 0, rows[:10])
+    add(second.get_collection(1), 10, rows[10:])
+
+    for store in stores:
+        handle = store.get_collection(1)
+        assert handle.count() == 20
+        assert handle.query([rows[15].tolist()], 1)["documents"] == [["text 15"]]
+        assert handle.query([rows[5].tolist()], 1)["documents"] == [["text 5"]]
+
+
+def test_users_do_not_see_each_other(stores):
+    store, _ = stores
+    rows = vectors(10)
+    add(store.create_collection(1), 0, rows[:5])
+    add(store.create_collection(2), 5, rows[5:], document_id=2)
+
+    result = store.get_collection(2).query([rows[0].tolist()], 10)
+
+    assert set(result["ids"][0]) == {f"c{i}" for i in range(5, 10)}